@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""HTTP JSON API over the protocols, for CAD and ePCR integrations.
+
+Serves the snapshot app.py loads (see snapshot.py), with the same live
+reloading, from a single-threaded asyncio server using only the standard
+library:
+
+    GET /protocols                   every protocol's metadata, in book order
+    GET /protocols?ids=2.1,3.5A      those protocols in full (level= applies)
+    GET /protocols/{id}?level=P      one protocol, text limited to a provider level
+    GET /search?q=...&level=&limit=  ranked matches with snippets
+
+Protocol payloads are serialized, gzipped and hashed once per snapshot, so
+a request is a lookup. Batch and search responses are built on first
+request and kept in a small LRU. Every response carries a strong ETag
+and answers If-None-Match with 304; gzip is sent when accepted.
+
+Usage: python api.py [port] [host]   (default: 8502 127.0.0.1)
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import sys
+from collections import OrderedDict, namedtuple
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from blocks import LEVEL_HIERARCHY
+from facets import LEVELS
+from perf import timer
+from snapshot import load_snapshot
+
+DEFAULT_PORT = 8502
+
+# Search results returned by default, and at most
+SEARCH_LIMIT = 25
+MAX_SEARCH_LIMIT = 100
+
+# Protocols one batch request may ask for
+MAX_BATCH = 100
+
+# Built batch and search responses kept per snapshot
+RESPONSE_CACHE_SIZE = 1024
+
+# Bodies shorter than this are not worth compressing
+GZIP_MIN_SIZE = 256
+
+# Largest request head accepted, in bytes
+MAX_HEAD = 16384
+
+Payload = namedtuple('Payload', 'body gzipped etag')
+
+
+def make_payload(body):
+    """A Payload for a JSON body (bytes): gzipped copy and strong ETag."""
+    digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+    gzipped = gzip.compress(body, 6, mtime=0) if len(body) >= GZIP_MIN_SIZE else None
+    if gzipped is not None and len(gzipped) >= len(body):
+        gzipped = None
+    return Payload(body, gzipped, f'"{digest}"')
+
+
+def dump(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def header_json(proto):
+    return {
+        'id': proto.id,
+        'title': proto.title,
+        'section': proto.section,
+        'section_num': proto.section_num,
+        'provider_levels': list(proto.provider_levels),
+        'pages': list(proto.pages),
+    }
+
+
+def protocol_json(proto, level=None):
+    """A protocol in full, with only the blocks shown at level (None: all)."""
+    allowed = LEVEL_HIERARCHY.get(level) if level else None
+    blocks = [b for b in proto.blocks if not allowed or b.level is None or b.level in allowed]
+    return {
+        **header_json(proto),
+        'level': level,
+        'text': '\n'.join(b.text for b in blocks),
+        'blocks': [{'type': b.type, 'text': b.text, 'level': b.level} for b in blocks],
+        'refs': list(proto.refs),
+        'referenced_by': list(proto.referenced_by),
+        'related': list(proto.related),
+        'doses': [dose._asdict() for dose in proto.doses],
+    }
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Payloads:
+    """Every response body for one snapshot.
+
+    Protocol bodies for each level are built up front; batch and search
+    responses on first request, in an LRU cleared with the snapshot.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        protocols = snapshot.corpus.protocols
+        with timer('api.precompute'):
+            self.index = make_payload(dump({'protocols': [header_json(p) for p in protocols]}))
+            self.bodies = {
+                level: {p.id: dump(protocol_json(p, level)) for p in protocols}
+                for level in (None,) + LEVELS
+            }
+            self.protocols = {
+                level: {pid: make_payload(body) for pid, body in bodies.items()}
+                for level, bodies in self.bodies.items()
+            }
+        self.responses = OrderedDict()
+
+    def cached(self, key, build):
+        payload = self.responses.get(key)
+        if payload is None:
+            payload = self.responses[key] = build()
+            while len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+        else:
+            self.responses.move_to_end(key)
+        return payload
+
+    def protocol(self, pid, level):
+        payload = self.protocols[level].get(pid)
+        if payload is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No protocol {pid}")
+        return payload
+
+    def batch(self, ids, level):
+        """Protocols in the order asked for; unknown IDs are listed as missing.
+        Bodies are spliced from the precomputed ones, not re-serialized."""
+        def build():
+            bodies = self.bodies[level]
+            found = [bodies[pid] for pid in ids if pid in bodies]
+            missing = [pid for pid in ids if pid not in bodies]
+            return make_payload(b'{"protocols":[' + b','.join(found) + b'],"missing":' + dump(missing) + b'}')
+        return self.cached(('batch', ids, level), build)
+
+    def search(self, query, level, limit):
+        def build():
+            index, facets = self.snapshot.search_index, self.snapshot.facets
+            ids = index.search(query)
+            if level:
+                ids = facets.select(ids, facets.facets['level'][level])
+            tokens = index.query_tokens(query)
+            results = []
+            for pid in ids[:limit]:
+                proto = self.snapshot.corpus.by_id[pid]
+                snippet = index.snippet(pid, tokens)
+                results.append({'id': pid, 'title': proto.title, 'section': proto.section,
+                                'snippet': snippet[0] if snippet else None})
+            return make_payload(dump({'query': query, 'level': level, 'total': len(ids), 'results': results}))
+        return self.cached(('search', query, level, limit), build)
+
+
+def query_level(params):
+    level = params.get('level', [''])[0] or None
+    if level is not None and level not in LEVELS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"level must be one of {', '.join(LEVELS)}")
+    return level
+
+
+def route(payloads, target):
+    """The Payload for a request target, or ApiError."""
+    url = urlsplit(target)
+    params = parse_qs(url.query)
+    path = url.path.rstrip('/') or '/'
+    level = query_level(params)
+
+    if path == '/protocols':
+        if 'ids' not in params:
+            return payloads.index
+        ids = tuple(dict.fromkeys(pid.strip() for pid in ','.join(params['ids']).split(',') if pid.strip()))
+        if not ids or len(ids) > MAX_BATCH:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"ids must list 1 to {MAX_BATCH} protocol IDs")
+        return payloads.batch(ids, level)
+    if path.startswith('/protocols/'):
+        return payloads.protocol(unquote(path[len('/protocols/'):]), level)
+    if path == '/search':
+        query = ' '.join(params.get('q', [''])[0].lower().split())
+        if not query:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "q is required")
+        limit = params.get('limit', [str(SEARCH_LIMIT)])[0]
+        # isdigit() alone accepts digits int() rejects, such as '²'
+        if not (limit.isascii() and limit.isdigit()) or not 1 <= int(limit) <= MAX_SEARCH_LIMIT:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"limit must be 1 to {MAX_SEARCH_LIMIT}")
+        return payloads.search(query, level, int(limit))
+    raise ApiError(HTTPStatus.NOT_FOUND, f"No route {path}")
+
+
+def response_head(status, headers):
+    lines = [f'HTTP/1.1 {status.value} {status.phrase}']
+    lines.extend(f'{name}: {value}' for name, value in headers)
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+class ProtocolAPI:
+    """The asyncio server. Payloads are rebuilt when the live snapshot changes."""
+
+    def __init__(self):
+        self.payloads = Payloads(load_snapshot())
+
+    def current(self):
+        snap = load_snapshot()
+        if snap is not self.payloads.snapshot:
+            self.payloads = Payloads(snap)
+        return self.payloads
+
+    def respond(self, method, target, headers):
+        """(status, headers, body) for one request."""
+        if method not in ('GET', 'HEAD'):
+            return self.error(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed", [('Allow', 'GET, HEAD')])
+        try:
+            with timer('api.route'):
+                payload = route(self.current(), target)
+        except ApiError as e:
+            return self.error(e.status, str(e))
+        except Exception as e:
+            # A bug in one request is its 500, not a dropped connection
+            print(f"{method} {target}: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+            return self.error(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error")
+
+        use_gzip = payload.gzipped is not None and 'gzip' in headers.get('accept-encoding', '')
+        # Each encoding is its own representation, so it gets its own tag
+        etag = payload.etag[:-1] + '-gz"' if use_gzip else payload.etag
+        out = [('Content-Type', 'application/json; charset=utf-8'), ('ETag', etag),
+               ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+        match = headers.get('if-none-match')
+        if match and (match.strip() == '*' or etag in [tag.strip() for tag in match.split(',')]):
+            return HTTPStatus.NOT_MODIFIED, out, b''
+        body = payload.gzipped if use_gzip else payload.body
+        if use_gzip:
+            out.append(('Content-Encoding', 'gzip'))
+        return HTTPStatus.OK, out, body
+
+    def error(self, status, message, extra=()):
+        body = dump({'error': message})
+        return status, [('Content-Type', 'application/json; charset=utf-8'), *extra], body
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it or
+        asks to (HTTP/1.1 keep-alive)."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(response_head(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                               [('Content-Length', '0'), ('Connection', 'close')]))
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                parts = request_line.split()
+                if len(parts) != 3:
+                    writer.write(response_head(HTTPStatus.BAD_REQUEST, [('Content-Length', '0'), ('Connection', 'close')]))
+                    break
+                method, target, http_version = parts
+                headers = {}
+                for line in header_lines:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                if 'content-length' in headers or 'transfer-encoding' in headers:
+                    # Only GET and HEAD are served; a request body is not read
+                    keep_alive = False
+                else:
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection == 'keep-alive' if http_version == 'HTTP/1.0' else connection != 'close'
+
+                status, out, body = self.respond(method, target, headers)
+                out.append(('Content-Length', str(len(body))))
+                out.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+                writer.write(response_head(status, out))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT):
+    api = ProtocolAPI()
+    server = await asyncio.start_server(api.handle, host, port, limit=MAX_HEAD)
+    print(f"Serving {len(api.payloads.snapshot.corpus)} protocols on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    host = sys.argv[2] if len(sys.argv) > 2 else '127.0.0.1'
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,20 @@
 import streamlit as st
-import json
-import re
+import hashlib
+import time
 from pathlib import Path
+from urllib.parse import urlencode
+
+from autocomplete import ID_QUERY_RE, KIND_ID, KIND_MED, TOP_K
+from blocks import LEVEL_HIERARCHY, mark_spans, render_blocks
+from cards import card_list, dose_table, dosing_table
+from facets import AGES
+from perf import timed, timer, timings
+from search_index import QueryCache, SearchSession, normalize_query
+from protocol_store import CURRENT_VERSION, STORE_PATH, ProtocolCache, ProtocolStore
+from services import ServiceView, load_services
+from snapshot import index_corpus, load_snapshot
+
+run_start = time.perf_counter()
 
 st.set_page_config(
     page_title="MA EMS Protocols",
@@ -11,634 +24,499 @@ st.set_page_config(
 )
 
 # ---------- Apple-inspired CSS ----------
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap');
-
-/* Global reset */
-html, body, [class*="css"] {
-    font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif !important;
-    font-size: 16px;
-}
-
-/* Force light theme everywhere */
-*, *::before, *::after {
-    color-scheme: light !important;
-}
-[data-testid="stAppViewContainer"],
-[data-testid="stApp"],
-[data-testid="stAppViewBlockContainer"],
-[data-testid="stMain"],
-[data-testid="stMainBlockContainer"],
-[data-testid="stVerticalBlock"],
-.main, .stApp, .block-container,
-[data-testid="stHeader"],
-section[data-testid="stSidebar"] {
-    background-color: #ffffff !important;
-    color: #1d1d1f !important;
-}
-div[data-testid="stMarkdownContainer"] {
-    color: #1d1d1f !important;
-}
-div[data-testid="stTextInput"] input {
-    color: #1d1d1f !important;
-}
-/* Segmented control */
-div[data-testid="stSegmentedControl"] {
-    background-color: #f0f0f0 !important;
-}
-div[data-testid="stSegmentedControl"] button {
-    color: #1d1d1f !important;
-    background-color: transparent !important;
-}
-div[data-testid="stSegmentedControl"] button[aria-pressed="true"] {
-    background-color: #ffffff !important;
-    color: #d9534f !important;
-}
-
-/* Hide Streamlit chrome */
-#MainMenu, footer, header {visibility: hidden;}
-.stDeployButton {display: none;}
-div[data-testid="stToolbar"] {display: none;}
-
-/* Main container spacing */
-.block-container {
-    padding-top: 1.5rem !important;
-    padding-bottom: 2rem !important;
-    max-width: 720px !important;
-}
-
-/* App title */
-.app-title {
-    font-size: 1.8rem;
-    font-weight: 800;
-    letter-spacing: -0.5px;
-    margin-bottom: 0;
-    color: #1d1d1f;
-}
-.app-subtitle {
-    font-size: 0.85rem;
-    color: #86868b;
-    font-weight: 500;
-    margin-top: 2px;
-    margin-bottom: 16px;
-}
-
-/* Level selector pills */
-.level-selector {
-    display: flex;
-    gap: 8px;
-    margin-bottom: 16px;
-    flex-wrap: wrap;
-}
-.level-pill {
-    padding: 8px 20px;
-    border-radius: 20px;
-    font-size: 0.85rem;
-    font-weight: 600;
-    border: 2px solid #e5e5ea;
-    background: white;
-    color: #1d1d1f;
-    cursor: pointer;
-    transition: all 0.2s;
-    text-decoration: none;
-}
-.level-pill:hover { border-color: #d1d1d6; background: #f5f5f7; }
-.level-pill.active { 
-    background: #d9534f; border-color: #d9534f; color: white; 
-}
-
-/* Search input */
-div[data-testid="stTextInput"] input {
-    font-size: 1rem !important;
-    font-family: 'Inter', -apple-system, sans-serif !important;
-    padding: 12px 16px !important;
-    border-radius: 12px !important;
-    border: 1.5px solid #e5e5ea !important;
-    background: #f5f5f7 !important;
-    transition: all 0.2s;
-}
-div[data-testid="stTextInput"] input:focus {
-    border-color: #d9534f !important;
-    background: white !important;
-    box-shadow: 0 0 0 3px rgba(217,83,79,0.12) !important;
-}
-div[data-testid="stTextInput"] label { display: none !important; }
-
-/* Section headers */
-.section-header {
-    font-size: 0.75rem;
-    font-weight: 700;
-    color: #86868b;
-    text-transform: uppercase;
-    letter-spacing: 1.2px;
-    padding: 20px 0 8px 4px;
-}
-
-/* Protocol cards */
-.proto-card {
-    padding: 14px 16px;
-    margin: 0 0 1px 0;
-    background: white;
-    border-bottom: 1px solid #f0f0f0;
-    cursor: pointer;
-    transition: background 0.15s;
-}
-.proto-card:hover { background: #f5f5f7; }
-.proto-card:first-child { border-radius: 12px 12px 0 0; }
-.proto-card:last-child { border-radius: 0 0 12px 12px; border-bottom: none; }
-.proto-card-wrapper {
-    background: white;
-    border-radius: 12px;
-    border: 1px solid #e5e5ea;
-    overflow: hidden;
-    margin-bottom: 8px;
-}
-.proto-id-badge {
-    font-weight: 700;
-    color: #d9534f;
-    font-size: 0.85rem;
-    margin-right: 8px;
-    min-width: 36px;
-    display: inline-block;
-}
-.proto-title-text {
-    font-weight: 500;
-    font-size: 0.95rem;
-    color: #1d1d1f;
-}
-.proto-arrow {
-    float: right;
-    color: #c7c7cc;
-    font-size: 1rem;
-}
-
-/* Provider level badges */
-.lvl-badge {
-    display: inline-block;
-    padding: 2px 8px;
-    border-radius: 6px;
-    font-size: 0.7rem;
-    font-weight: 700;
-    margin-right: 4px;
-    letter-spacing: 0.3px;
-}
-.lvl-FR { background: #007aff; color: white; }
-.lvl-E { background: #f0ad4e; color: #1d1d1f; }
-.lvl-A { background: #34c759; color: white; }
-.lvl-P { background: #d9534f; color: white; }
-
-/* Detail view */
-.detail-header {
-    font-size: 1.5rem;
-    font-weight: 800;
-    letter-spacing: -0.3px;
-    color: #1d1d1f;
-    margin-bottom: 4px;
-    line-height: 1.3;
-}
-.detail-badges {
-    margin-bottom: 16px;
-}
-
-/* Protocol content */
-.protocol-body {
-    font-size: 0.95rem;
-    line-height: 1.75;
-    color: #1d1d1f;
-}
-.protocol-body .section-title {
-    font-weight: 700;
-    font-size: 1rem;
-    color: #1d1d1f;
-    margin-top: 20px;
-    margin-bottom: 8px;
-    padding-bottom: 4px;
-    border-bottom: 2px solid #d9534f;
-    display: inline-block;
-}
-.protocol-body .bullet {
-    padding-left: 20px;
-    margin: 6px 0;
-    position: relative;
-}
-.protocol-body .bullet::before {
-    content: "•";
-    position: absolute;
-    left: 4px;
-    color: #d9534f;
-    font-weight: 700;
-}
-.protocol-body .sub-bullet {
-    padding-left: 40px;
-    margin: 4px 0;
-    position: relative;
-    color: #424245;
-}
-.protocol-body .sub-bullet::before {
-    content: "–";
-    position: absolute;
-    left: 24px;
-    color: #86868b;
-}
-.protocol-body .note-block {
-    background: #f5f5f7;
-    border-radius: 10px;
-    padding: 12px 16px;
-    margin: 12px 0;
-    font-size: 0.9rem;
-    color: #424245;
-}
-.protocol-body .caution-block {
-    background: #fff3cd;
-    border-left: 4px solid #d9534f;
-    border-radius: 0 10px 10px 0;
-    padding: 12px 16px;
-    margin: 12px 0;
-    font-weight: 600;
-    color: #856404;
-}
-.protocol-body .standing-orders {
-    font-weight: 700;
-    font-size: 0.95rem;
-    color: white;
-    background: #424245;
-    padding: 8px 14px;
-    border-radius: 8px;
-    margin: 16px 0 8px 0;
-    display: inline-block;
-}
-.protocol-body .standing-orders.emt { background: #f0ad4e; color: #1d1d1f; }
-.protocol-body .standing-orders.aemt { background: #34c759; }
-.protocol-body .standing-orders.paramedic { background: #d9534f; }
-.protocol-body .standing-orders.fr { background: #007aff; }
-.protocol-body .standing-orders.mc { background: #6e6e73; }
-.protocol-body .plain {
-    margin: 6px 0;
-}
-
-/* Back button */
-.back-link {
-    font-size: 0.9rem;
-    font-weight: 600;
-    color: #d9534f;
-    cursor: pointer;
-    padding: 8px 0;
-    display: inline-block;
-    margin-bottom: 8px;
-}
-
-/* Streamlit button overrides */
-div[data-testid="stButton"] button {
-    text-align: left !important;
-    border: none !important;
-    background: none !important;
-    padding: 10px 16px !important;
-    font-family: 'Inter', -apple-system, sans-serif !important;
-    font-size: 0.95rem !important;
-    font-weight: 500 !important;
-    color: #1d1d1f !important;
-    border-radius: 0 !important;
-    border-bottom: 1px solid #f0f0f0 !important;
-    width: 100% !important;
-    transition: background 0.15s !important;
-}
-div[data-testid="stButton"] button:hover {
-    background: #f5f5f7 !important;
-    border-color: #f0f0f0 !important;
-}
-div[data-testid="stButton"] button p {
-    font-size: 0.95rem !important;
-    color: #1d1d1f !important;
-}
-
-/* Force all text colors for light mode */
-p, span, div, li, label, h1, h2, h3, h4 {
-    color: #1d1d1f !important;
-}
-.section-header, .app-subtitle {
-    color: #86868b !important;
-}
-
-/* Segmented control override */
-div[data-testid="stSegmentedControl"] button {
-    border-radius: 20px !important;
-    font-weight: 600 !important;
-    font-size: 0.85rem !important;
-    border: none !important;
-    border-bottom: none !important;
-    padding: 8px 18px !important;
-}
-
-/* No results */
-.no-results {
-    text-align: center;
-    padding: 40px 20px;
-    color: #86868b;
-    font-size: 0.95rem;
-}
-
-/* Divider */
-.thin-divider {
-    height: 1px;
-    background: #e5e5ea;
-    margin: 16px 0;
-}
-</style>
-""", unsafe_allow_html=True)
+# Served from static/ (server.enableStaticServing) so the browser fetches it
+# once and caches it; each rerun only re-sends this link. The content hash
+# in the URL changes whenever the stylesheet does.
+CSS_PATH = Path(__file__).parent / "static" / "app.css"
+css_version = hashlib.sha256(CSS_PATH.read_bytes()).hexdigest()[:12]
+st.markdown(f'<link rel="stylesheet" href="app/static/app.css?v={css_version}">', unsafe_allow_html=True)
 
 
 # ---------- Load data ----------
-@st.cache_data
-def load_protocols():
-    p = Path(__file__).parent / "protocols_parsed.json"
-    with open(p) as f:
-        data = json.load(f)
-    protos = list(data.values())
-    def sort_key(p):
-        m = re.match(r'(\d+)\.(\d+)([A-Z]?)', p['id'])
-        if m:
-            return (int(m.group(1)), int(m.group(2)), m.group(3))
-        return (99, 99, p['id'])
-    protos.sort(key=sort_key)
-    return {p['id']: p for p in protos}, protos
-
-protocols_dict, protocols_list = load_protocols()
-
-
-# ---------- Format protocol content for display ----------
-def get_section_level(line):
-    """Determine which provider level a standing orders section belongs to."""
-    if re.match(r'^(FIRST RESPONDER|FR)\s+STANDING\s+ORDER', line, re.I):
-        return 'FR'
-    elif re.match(r'^EMT\s+STANDING\s+ORDER', line, re.I):
-        return 'E'
-    elif re.match(r'^ADVANCED\s+EMT\s+STANDING\s+ORDER', line, re.I):
-        return 'A'
-    elif re.match(r'^PARAMEDIC\s+STANDING\s+ORDER', line, re.I):
-        return 'P'
-    elif re.match(r'^MEDICAL\s+CONTROL', line, re.I):
-        return 'MC'
-    return None
-
-# Level hierarchy: each level can do everything below them
-LEVEL_HIERARCHY = {
-    'FR': ['FR'],
-    'E': ['FR', 'E'],
-    'A': ['FR', 'E', 'A'],
-    'P': ['FR', 'E', 'A', 'P', 'MC'],
-}
-
-def extract_cross_references(text):
-    """Extract referenced protocol IDs from text."""
-    # Match "Protocol X.X", "Protocol X.XA", "protocol 2.3A/P" etc.
-    pattern = r'[Pp]rotocol\s+(\d+\.\d+[A-Z]?(?:/[A-Z])?)'
-    refs = set()
-    for m in re.finditer(pattern, text):
-        ref_id = m.group(1)
-        # Handle "3.4A/P" -> add both 3.4A and 3.4P
-        if '/' in ref_id:
-            base, suffix = ref_id.split('/')
-            # base is like "3.4A", suffix is like "P"
-            refs.add(base)
-            refs.add(base[:-1] + suffix)
-        else:
-            refs.add(ref_id)
-    return sorted(refs)
+# The corpus and its indexes, shared by every session and already in memory
+# when served through serve.py. When the pipeline rewrites the data they are
+# rebuilt in the background and swapped in whole; each run works on the
+# snapshot it started with.
+DATA_PATH = Path(__file__).parent / "protocols_parsed.json"
+current = load_snapshot(DATA_PATH)
+version = current.stamp
+
+
+def check_reload():
+    """Rerun the whole script once newer data has been swapped in, so a
+    fragment rerun does not keep using the old snapshot."""
+    if load_snapshot(DATA_PATH) is not current:
+        st.rerun()
 
 
-def format_protocol_html(text, active_level=None):
-    lines = text.split('\n')
-    html_parts = []
-    
-    current_section_level = None  # Track which provider section we're in
-    skipping = False  # Whether we're skipping content for level filter
-    
-    # Determine which sections to show based on level hierarchy
-    if active_level:
-        allowed = LEVEL_HIERARCHY.get(active_level, ['FR', 'E', 'A', 'P', 'MC'])
-    else:
-        allowed = None  # Show all
-    
-    for line in lines:
-        stripped = line.strip()
-        if not stripped:
-            continue
-        
-        # Check if this is a standing orders header
-        section_level = get_section_level(stripped)
-        if section_level:
-            current_section_level = section_level
-            if allowed and section_level not in allowed:
-                skipping = True
-            else:
-                skipping = False
-        
-        # Check if this is a non-provider section (general content, notes, etc.)
-        if stripped.isupper() and len(stripped) > 4 and not stripped.startswith('•') and not section_level:
-            current_section_level = None
-            skipping = False
-        if 'CAUTION' in stripped.upper() or 'RED FLAG' in stripped.upper():
-            skipping = False
-        if stripped.upper().startswith('NOTE:') or stripped.upper().startswith('PEARLS:') or stripped.upper().startswith('PEARL:'):
-            skipping = False
-        
-        # Skip content not relevant to selected level
-        if skipping:
-            continue
-        
-        # Caution / red flag
-        if 'CAUTION' in stripped.upper() or 'RED FLAG' in stripped.upper():
-            html_parts.append(f'<div class="caution-block">⚠️ {stripped}</div>')
-        # Standing orders headers
-        elif section_level == 'FR':
-            html_parts.append(f'<div class="standing-orders fr">{stripped}</div>')
-        elif section_level == 'E':
-            html_parts.append(f'<div class="standing-orders emt">{stripped}</div>')
-        elif section_level == 'A':
-            html_parts.append(f'<div class="standing-orders aemt">{stripped}</div>')
-        elif section_level == 'P':
-            html_parts.append(f'<div class="standing-orders paramedic">{stripped}</div>')
-        elif section_level == 'MC':
-            html_parts.append(f'<div class="standing-orders mc">{stripped}</div>')
-        # Section titles (ALL CAPS lines)
-        elif stripped.isupper() and len(stripped) > 4 and not stripped.startswith('•'):
-            html_parts.append(f'<div class="section-title">{stripped}</div>')
-        # NOTE blocks
-        elif stripped.upper().startswith('NOTE:') or stripped.upper().startswith('NOTE '):
-            html_parts.append(f'<div class="note-block">📝 {stripped}</div>')
-        elif stripped.upper().startswith('PEARLS:') or stripped.upper().startswith('PEARL:'):
-            html_parts.append(f'<div class="note-block">💡 {stripped}</div>')
-        # Bullet points
-        elif stripped.startswith('•'):
-            html_parts.append(f'<div class="bullet">{stripped[1:].strip()}</div>')
-        # Sub-bullets
-        elif stripped.startswith('o ') or stripped.startswith('- '):
-            html_parts.append(f'<div class="sub-bullet">{stripped[2:].strip()}</div>')
-        # Provider level indicators at start
-        elif re.match(r'^[EAPFR]\s+•', stripped):
-            html_parts.append(f'<div class="bullet">{stripped[2:].strip()}</div>')
-        elif re.match(r'^[EAPFR]\s', stripped) and len(stripped) > 3:
-            html_parts.append(f'<div class="bullet">{stripped[2:].strip()}</div>')
-        else:
-            html_parts.append(f'<div class="plain">{stripped}</div>')
-    
-    result = '\n'.join(html_parts)
-    
-    # Highlight cross-references in the HTML
-    def highlight_ref(m):
-        return f'<span style="color:#d9534f;font-weight:600;text-decoration:underline;text-decoration-style:dotted;">{m.group(0)}</span>'
-    result = re.sub(r'[Pp]rotocol\s+\d+\.\d+[A-Z]?(?:/[A-Z])?', highlight_ref, result)
-    
-    return result
+# ---------- Protocol versions ----------
+# protocols.db can hold other live versions (an earlier release during a
+# rollout, regional variants), picked with ?v=. Their lists come from the
+# metadata columns only; a protocol's content is read when it is opened.
+@st.cache_resource
+def get_store(exists):
+    return ProtocolStore(STORE_PATH, readonly=True) if exists else None
+
+
+@st.cache_resource(max_entries=4)
+def get_version_snapshot(version, source):
+    """A stored version's protocols, without content, and their indexes."""
+    with timer('load.version'):
+        return index_corpus(store.headers(version), source)
+
+
+@st.cache_resource
+def get_protocol_cache(exists):
+    """Opened and prefetched stored protocols, shared across sessions."""
+    return ProtocolCache(store) if exists else None
 
 
-# ---------- Session state ----------
-if 'view' not in st.session_state:
-    st.session_state.view = 'list'
-if 'selected_id' not in st.session_state:
-    st.session_state.selected_id = None
+store = get_store(STORE_PATH.exists())
+protocol_cache = get_protocol_cache(STORE_PATH.exists())
+version_options = sorted(set(store.versions() if store else []) | {CURRENT_VERSION}, reverse=True)
+active_version = st.query_params.get('v')
+if active_version not in version_options or active_version == CURRENT_VERSION:
+    active_version = None
+
+if active_version:
+    snapshot = get_version_snapshot(active_version, store.source(active_version))
+else:
+    snapshot = current
+corpus = snapshot.corpus
+protocols_dict, protocols_list = corpus.by_id, corpus.protocols
+search_index = snapshot.search_index
+completion_trie, med_mentions, med_names = snapshot.completions, snapshot.med_mentions, snapshot.med_names
+facet_index = snapshot.facets
+
+
+# ---------- Service overlays ----------
+# Ambulance services sharing this server each adopt their own Medical
+# Director Options (?svc=). A service's view masks and extends the snapshot
+# above without copying it.
+@st.cache_resource
+def get_services():
+    return load_services()
+
+
+@st.cache_resource(max_entries=16)
+def get_service_view(slug, stamp, _snapshot):
+    """A service's overlay on the snapshot with this stamp."""
+    return ServiceView(_snapshot, services[slug])
+
+
+services = get_services()
+active_service = st.query_params.get('svc')
+if active_service not in services:
+    active_service = None
+service_view = get_service_view(active_service, snapshot.stamp, snapshot) if active_service else None
+
+
+@st.cache_resource
+def get_query_cache():
+    """Ranked results shared across sessions, keyed by normalized query."""
+    return QueryCache()
+
+query_cache = get_query_cache()
+
+
+# ---------- URL state ----------
+# The open protocol, provider level and list state live in the query string
+# (?p=3.5A&level=P&q=...). Protocol links are plain <a> tags, so the list is
+# a single element, and a detail URL renders that protocol without the list.
+PAGE_SIZE = 25
+level_options = ["All", "FR", "EMT", "AEMT", "Paramedic"]
+level_map = {"FR": "FR", "EMT": "E", "AEMT": "A", "Paramedic": "P", "All": None}
+level_labels = {code: label for label, code in level_map.items() if code}
+
+# Query param -> session state key of the list widgets
+URL_STATE = {'q': 'search', 'section': 'facet_section', 'age': 'facet_age', 'med': 'facet_med'}
+
+
+def load_url_state():
+    """Seed the list widgets from the URL."""
+    params = st.query_params
+    st.session_state.search = params.get('q', '')
+    st.session_state.version = active_version or CURRENT_VERSION
+    st.session_state.service = active_service
+    st.session_state.provider_level = level_labels.get(params.get('level'), 'All')
+    st.session_state.facet_section = params.get('section') if params.get('section') in facet_index.facets['section'] else None
+    st.session_state.facet_age = params.get('age') if params.get('age') in AGES else None
+    st.session_state.facet_med = params.get('med') if params.get('med') in med_mentions else None
+    page = params.get('page', '1')
+    # isdigit() alone accepts digits int() rejects, such as '²'
+    st.session_state.page = max(int(page), 1) if page.isascii() and page.isdigit() else 1
+
+
+def url_params(**changes):
+    """Query params for the current list state, with changes applied."""
+    params = {k: v for k, v in st.query_params.items() if k not in URL_STATE and k not in ('p', 'v', 'svc', 'level', 'page')}
+    if st.session_state.get('version', CURRENT_VERSION) != CURRENT_VERSION:
+        params['v'] = st.session_state.version
+    if st.session_state.get('service'):
+        params['svc'] = st.session_state.service
+    for param, key in URL_STATE.items():
+        if st.session_state.get(key):
+            params[param] = st.session_state[key]
+    level = level_map.get(st.session_state.get('provider_level'))
+    if level:
+        params['level'] = level
+    if st.session_state.get('page', 1) > 1:
+        params['page'] = str(st.session_state.page)
+    params.update(changes)
+    return params
+
+
+def protocol_href(pid):
+    return '?' + urlencode(url_params(p=pid))
+
+
+if 'url_loaded' not in st.session_state:
+    st.session_state.url_loaded = True
+    load_url_state()
+
 
 def show_protocol(pid):
-    st.session_state.selected_id = pid
-    st.session_state.view = 'detail'
+    st.query_params['p'] = pid
 
 def go_back():
-    st.session_state.view = 'list'
-    st.session_state.selected_id = None
+    st.query_params.pop('p', None)
+    # List widgets drop their state while the detail view is up
+    load_url_state()
+
+def quick_jump():
+    """Open the chosen completion: its protocol, or a medication's protocol
+    list when it names more than one."""
+    item = st.session_state.quick_jump
+    st.session_state.quick_jump = None
+    if not item:
+        return
+    kind, name, _, ids = item
+    if kind == KIND_MED and len(ids) > 1:
+        st.session_state.search = name
+    else:
+        show_protocol(ids[0])
+
+
+def debug_panel():
+    """Hidden panel (?debug=1): query cache stats and hot-path latencies."""
+    if not st.query_params.get("debug"):
+        return
+    st.caption(f"Query cache: {query_cache.stats()}")
+    if protocol_cache:
+        st.caption(f"Protocol cache: {protocol_cache.stats()}")
+    rows = [{k: round(v, 3) if isinstance(v, float) else v for k, v in row.items()} for row in timings.summary()]
+    if rows:
+        with st.expander("Latency (ms)", expanded=True):
+            st.dataframe(rows, hide_index=True)
 
 
 # ==================== DETAIL VIEW ====================
-if st.session_state.view == 'detail' and st.session_state.selected_id:
-    proto = protocols_dict.get(st.session_state.selected_id)
-    if not proto:
-        go_back()
-        st.rerun()
-    
-    if st.button("← Back"):
-        go_back()
-        st.rerun()
-    
-    # Header
-    st.markdown(f'<div class="detail-header">{proto["id"]} — {proto["title"]}</div>', unsafe_allow_html=True)
-    
-    badges = " ".join(f'<span class="lvl-badge lvl-{l}">{l}</span>' for l in proto.get('provider_levels', []))
-    st.markdown(f'<div class="detail-badges">{badges}</div>', unsafe_allow_html=True)
-    st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
+@st.fragment
+@timed('rerun.detail')
+def detail_body(proto):
+    """Level switch, content and cross-references. Switching the level
+    reruns only this fragment."""
+    check_reload()
+    if 'detail_level' not in st.session_state:
+        st.session_state.detail_level = level_labels.get(st.query_params.get('level'), 'All')
+    st.segmented_control(
+        "Provider Level",
+        options=level_options,
+        key="detail_level",
+        label_visibility="collapsed",
+    )
+    detail_level = level_map.get(st.session_state.detail_level)
+    if detail_level:
+        st.query_params['level'] = detail_level
+    else:
+        st.query_params.pop('level', None)
     
-    # Get active level from session state
-    detail_level_map = {"FR": "FR", "EMT": "E", "AEMT": "A", "Paramedic": "P", "All": None}
-    detail_level = detail_level_map.get(st.session_state.get('provider_level', 'All'))
+    # Formatted content filtered by provider level, with the hits of the
+    # search that led here marked
+    last_query = st.query_params.get('q', '').strip().lower()
+    spans = search_index.hit_spans(proto.id, search_index.query_tokens(last_query)) if last_query else None
+    with timer('render.blocks'):
+        html = render_blocks(proto.blocks, active_level=detail_level, spans=spans)
+    with timer('emit.detail'):
+        st.markdown(f'<div class="protocol-body">{html}</div>', unsafe_allow_html=True)
     
-    # Formatted content filtered by provider level
-    html = format_protocol_html(proto['content'], active_level=detail_level)
-    st.markdown(f'<div class="protocol-body">{html}</div>', unsafe_allow_html=True)
+    # Per-kg doses for every weight band and tape color, computed with the data
+    table = snapshot.dosing.get(proto.id)
+    if table:
+        allowed = LEVEL_HIERARCHY.get(detail_level)
+        rows = [i for i, dose in enumerate(table.doses)
+                if not allowed or not dose.level or dose.level in allowed]
+        if rows:
+            st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
+            st.markdown('<div class="section-header">Pediatric Dosing</div>', unsafe_allow_html=True)
+            by_weight, by_color = st.tabs(["By weight", "By tape color"])
+            with timer('render.dosing'):
+                weight_html = dosing_table(table, rows)
+                color_html = dosing_table(table, rows, by_color=True)
+            by_weight.markdown(weight_html, unsafe_allow_html=True)
+            by_color.markdown(color_html, unsafe_allow_html=True)
     
-    # Cross-references section
-    refs = extract_cross_references(proto['content'])
-    # Filter to only refs that exist and aren't self
-    valid_refs = [r for r in refs if r in protocols_dict and r != proto['id']]
-    if valid_refs:
-        st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
-        st.markdown('<div class="section-header">Referenced Protocols</div>', unsafe_allow_html=True)
-        for ref_id in valid_refs:
-            ref_proto = protocols_dict[ref_id]
-            if st.button(f"**{ref_id}** · {ref_proto['title']}", key=f"ref_{ref_id}"):
-                show_protocol(ref_id)
-                st.rerun()
+    # Cross-references both ways and similar protocols, all built with the data
+    ref_href = lambda pid: '?' + urlencode({**st.query_params.to_dict(), 'p': pid})
+    for heading, ids in (("Referenced Protocols", proto.refs), ("Referenced By", proto.referenced_by),
+                         ("See Also", proto.related)):
+        if service_view:
+            ids = [pid for pid in ids if service_view.shows(pid)]
+        if ids:
+            st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="section-header">{heading}</div>', unsafe_allow_html=True)
+            ref_protos = [protocols_dict[pid] for pid in ids]
+            st.markdown(card_list(ref_protos, ref_href, target="_self"), unsafe_allow_html=True)
     
-    st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
-    if st.button("← Back", key="back_bottom"):
-        go_back()
-        st.rerun()
+    debug_panel()
 
 
 # ==================== LIST VIEW ====================
-else:
-    # Title
-    st.markdown('<div class="app-title">🚑 MA EMS Protocols</div>', unsafe_allow_html=True)
-    st.markdown('<div class="app-subtitle">Statewide Treatment Protocols · v2026.1</div>', unsafe_allow_html=True)
+@st.fragment
+@timed('rerun.list')
+def list_body():
+    """Filters, search box and results. Typing, filtering and paging rerun
+    only this fragment; opening a protocol reruns the whole app."""
+    if st.query_params.get('p'):
+        st.rerun()
+    check_reload()
+    if st.session_state.get('version', CURRENT_VERSION) != (active_version or CURRENT_VERSION):
+        # Another version's data is loaded by the whole script
+        st.session_state.facet_med = None
+        st.query_params.from_dict(url_params())
+        st.rerun()
+    if st.session_state.get('service') != active_service:
+        st.query_params.from_dict(url_params())
+        st.rerun()
+    
+    # Facet selections and the query are read ahead of their widgets so
+    # every count can reflect all the other filters
+    query = st.session_state.get('search', '').strip().lower()
+    selection = {
+        'level': level_map.get(st.session_state.get('provider_level', 'All')),
+        'section': st.session_state.get('facet_section'),
+        'age': st.session_state.get('facet_age'),
+        'medication': st.session_state.get('facet_med'),
+    }
+    
+    med_name = med_names.get(query)
+    completions = []
+    
+    # Search hits, unfiltered; facets are applied below with bitwise AND.
+    # ID and medication lookups come straight from the completion trie and
+    # the precomputed mention lists, skipping the scoring path; a number no
+    # ID starts with ("12", "50") is searched as text
+    ids = None
+    if med_name:
+        with timer('search.lookup'):
+            ids = med_mentions[med_name]
+    elif ID_QUERY_RE.match(query):
+        with timer('search.lookup'):
+            ids = [item[1] for item in completion_trie.complete(query, k=TOP_K) if item[0] == KIND_ID] or None
+    if query and ids is None:
+        # Quick-jump completions for titles and medications
+        with timer('search.complete'):
+            completions = completion_trie.complete(query, k=6)
+            if service_view:
+                completions = service_view.completions(completions)
+        if active_version:
+            # Stored versions are searched in the store's full-text index
+            with timer('search.store'):
+                ids = store.search(active_version, query)
+        else:
+            cache_key = normalize_query(query)
+            ids = query_cache.get(cache_key, version)
+            if ids is None:
+                # Each session narrows its previous hits while the query grows
+                session = st.session_state.get('search_session')
+                if session is None or session.index is not search_index:
+                    session = st.session_state.search_session = SearchSession(search_index)
+                with timer('search.score'):
+                    ids = session.search(query)
+                # Only full-index rankings are shared; a narrowed one
+                # depends on this session's previous query
+                if not session.narrowed:
+                    query_cache.put(cache_key, ids, version)
+        if service_view:
+            # The service's addenda are not in the shared index
+            ids = list(ids) + [pid for pid in service_view.search_addenda(query) if pid not in ids]
+    with timer('facets.counts'):
+        hit_mask = facet_index.mask_of(ids) if ids is not None else None
+        if service_view:
+            hit_mask = service_view.visible if hit_mask is None else hit_mask & service_view.visible
+        level_counts, level_total = facet_index.counts('level', selection, hit_mask)
     
     # Provider level filter
-    level_options = ["All", "FR", "EMT", "AEMT", "Paramedic"]
-    level_map = {"FR": "FR", "EMT": "E", "AEMT": "A", "Paramedic": "P", "All": None}
-    selected_level = st.segmented_control(
+    st.segmented_control(
         "Provider Level",
         options=level_options,
-        default="All",
         key="provider_level",
+        format_func=lambda opt: f"{opt} {level_total if opt == 'All' else level_counts[level_map[opt]]}",
         label_visibility="collapsed",
     )
-    active_level = level_map.get(selected_level)
     
     # Search
-    search = st.text_input(
+    st.text_input(
         "Search",
         placeholder="Search protocols...",
         label_visibility="collapsed",
+        key="search",
     )
+    if completions:
+        st.pills(
+            "Jump to",
+            options=completions,
+            format_func=lambda item: item[2],
+            key="quick_jump",
+            on_change=quick_jump,
+            label_visibility="collapsed",
+        )
     
-    query = search.strip().lower() if search else ""
+    # Version / section / age / medication facets
+    with st.expander("Filters"):
+        if len(version_options) > 1:
+            st.selectbox("Protocol version", options=version_options, key="version")
+        if services:
+            st.selectbox(
+                "Service",
+                options=[None] + list(services),
+                format_func=lambda slug: "Statewide (all options)" if slug is None else services[slug].name,
+                key="service",
+            )
+        section_counts, section_total = facet_index.counts('section', selection, hit_mask)
+        st.selectbox(
+            "Section",
+            options=[None] + list(section_counts),
+            format_func=lambda sec: f"All sections ({section_total})" if sec is None
+                else f"{sec.replace('Section ', '')} ({section_counts[sec]})",
+            key="facet_section",
+        )
+        age_counts, _ = facet_index.counts('age', selection, hit_mask)
+        st.segmented_control(
+            "Age group",
+            options=AGES,
+            format_func=lambda age: f"{age} {age_counts[age]}",
+            key="facet_age",
+        )
+        med_counts, med_total = facet_index.counts('medication', selection, hit_mask)
+        st.selectbox(
+            "Mentions medication",
+            options=[None] + list(med_counts),
+            format_func=lambda med: f"Any medication ({med_total})" if med is None
+                else f"{med} ({med_counts[med]})",
+            key="facet_med",
+        )
     
-    # Filter by level
-    if active_level:
-        pool = [p for p in protocols_list if active_level in p.get('provider_levels', []) or 'ALL' in p.get('provider_levels', [])]
-    else:
-        pool = protocols_list
+    with timer('facets.filter'):
+        mask = facet_index.mask(selection)
+        if service_view:
+            mask &= service_view.visible
+        if ids is None:
+            filtered = [protocols_dict[pid] for pid in facet_index.members(mask)]
+        else:
+            filtered = [protocols_dict[pid] for pid in facet_index.select(ids, mask)]
     
-    # Search filter
-    if query:
-        scored = []
-        for proto in pool:
-            title_l = proto['title'].lower()
-            id_l = proto['id'].lower()
-            content_l = proto['content'].lower()
-            
-            score = 0
-            if query == id_l:
-                score = 100
-            elif query in id_l:
-                score = 50
-            elif query in title_l:
-                if any(w.startswith(query) for w in title_l.split()):
-                    score = 30
-                else:
-                    score = 20
-            elif query in content_l:
-                score = min(10, 1 + content_l.count(query))
-            
-            if score > 0:
-                scored.append((score, proto))
-        
-        scored.sort(key=lambda x: (-x[0], x[1]['id']))
-        filtered = [p for _, p in scored]
-    else:
-        filtered = pool
+    # Back to the first page whenever the query or a filter changes
+    list_key = (active_version, active_service, query, tuple(selection.values()))
+    if st.session_state.get('list_key') != list_key:
+        if 'list_key' in st.session_state:
+            st.session_state.page = 1
+        st.session_state.list_key = list_key
+    n_pages = max(1, -(-len(filtered) // PAGE_SIZE))
+    if not st.session_state.get('page') or st.session_state.page > n_pages:
+        st.session_state.page = 1
+    start = (st.session_state.page - 1) * PAGE_SIZE
+    page_protos = filtered[start:start + PAGE_SIZE]
+    
+    # Every listed protocol's doses of the medication searched for or
+    # filtered on, from the index built with the data
+    dose_med = med_name or selection['medication']
+    if dose_med in snapshot.doses:
+        with timer('render.doses'):
+            listed = {p.id for p in filtered}
+            allowed = LEVEL_HIERARCHY.get(selection['level'])
+            doses = [dose for dose in snapshot.doses[dose_med]
+                     if dose.protocol in listed and (not allowed or not dose.level or dose.level in allowed)]
+        if doses:
+            st.markdown(dose_table(dose_med, doses, protocol_href, target="_self"), unsafe_allow_html=True)
     
     # Results count when searching
     if query:
         count = len(filtered)
-        st.markdown(f'<div style="color:#86868b;font-size:0.8rem;padding:4px 0 8px 4px;">{count} result{"s" if count != 1 else ""}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="result-count">{count} result{"s" if count != 1 else ""}</div>', unsafe_allow_html=True)
     
     if not filtered:
         st.markdown('<div class="no-results">No protocols found.<br>Try different keywords.</div>', unsafe_allow_html=True)
     elif query:
-        # Flat results
-        for proto in filtered:
-            if st.button(f"**{proto['id']}**  ·  {proto['title']}", key=f"p_{proto['id']}", use_container_width=True):
-                show_protocol(proto['id'])
-                st.rerun()
+        # Flat results, each with a keyword-in-context snippet
+        with timer('render.snippets'):
+            hit_tokens = search_index.query_tokens(query)
+            snippets = {}
+            for proto in page_protos:
+                snip = search_index.snippet(proto.id, hit_tokens)
+                if snip:
+                    text, spans = snip
+                    snippets[proto.id] = mark_spans(text, 0, spans)
+        with timer('emit.list'):
+            st.markdown(card_list(page_protos, protocol_href, snippets=snippets, target="_self"), unsafe_allow_html=True)
     else:
         # Grouped by section
-        current_section = None
-        for proto in filtered:
-            sec = proto.get('section', 'Other')
-            if sec != current_section:
-                current_section = sec
-                # Clean section name
-                sec_display = sec.replace('Section ', '').replace(' –', ' ·')
-                st.markdown(f'<div class="section-header">{sec_display}</div>', unsafe_allow_html=True)
-            
-            if st.button(f"**{proto['id']}**  ·  {proto['title']}", key=f"p_{proto['id']}", use_container_width=True):
-                show_protocol(proto['id'])
-                st.rerun()
+        with timer('emit.list'):
+            st.markdown(card_list(page_protos, protocol_href, grouped=True, target="_self"), unsafe_allow_html=True)
+    
+    if n_pages > 1:
+        st.segmented_control(
+            "Page",
+            options=list(range(1, n_pages + 1)),
+            key="page",
+            label_visibility="collapsed",
+        )
+    
+    # Keep the URL in step with the list so it can be reloaded or shared
+    params = url_params()
+    if params != st.query_params.to_dict():
+        st.query_params.from_dict(params)
+    
+    debug_panel()
+
+
+# ==================== ROUTING ====================
+selected_id = st.query_params.get('p')
+if selected_id:
+    proto = protocols_dict.get(selected_id)
+    if proto and active_version:
+        source = store.source(active_version)
+        with timer('load.protocol'):
+            proto = protocol_cache.get(active_version, selected_id, source)
+        # Load what this protocol references while it is being read
+        protocol_cache.prefetch(active_version, proto.refs, source)
+    if service_view:
+        proto = service_view.protocol(proto)
+    if not proto:
+        go_back()
+        st.rerun()
+    
+    if st.button("← Back"):
+        go_back()
+        st.rerun()
+    
+    # Header
+    st.markdown(f'<div class="detail-header">{proto.id} — {proto.title}</div>', unsafe_allow_html=True)
+    
+    badges = " ".join(f'<span class="lvl-badge lvl-{l}">{l}</span>' for l in proto.provider_levels)
+    st.markdown(f'<div class="detail-badges">{badges}</div>', unsafe_allow_html=True)
+    st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
+    detail_body(proto)
+    
+    st.markdown('<div class="thin-divider"></div>', unsafe_allow_html=True)
+    if st.button("← Back", key="back_bottom"):
+        go_back()
+        st.rerun()
+else:
+    # Title
+    subtitle_service = f' · {services[active_service].name}' if active_service else ''
+    st.markdown('<div class="app-title">🚑 MA EMS Protocols</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="app-subtitle">Statewide Treatment Protocols · v{active_version or CURRENT_VERSION}{subtitle_service}</div>', unsafe_allow_html=True)
+    list_body()
+
+timings.record('rerun.app', time.perf_counter() - run_start)
@@ -0,0 +1,98 @@
+"""Prefix trie for instant quick-jump completions."""
+
+import re
+
+# Completion kinds, in display priority
+KIND_ID = 0
+KIND_MED = 1
+KIND_TITLE = 2
+
+# Completions cached per trie node; enough for every ID under a section
+TOP_K = 32
+
+# Title words too common to be worth completing
+STOPWORDS = {'and', 'the', 'for', 'with', 'by', 'of', 'or', 'an'}
+
+# Queries that can only be a protocol ID ("2.1", "3.5a", "a2")
+ID_QUERY_RE = re.compile(r'^(\d+(\.\d*)?[ap]?|a\d)$')
+
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+
+
+class CompletionTrie:
+    """Character trie whose nodes cache their top-k completions.
+
+    A lookup walks the typed prefix and returns the cached list, so its
+    cost depends on the prefix length only.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+
+    def insert(self, key, rank, item):
+        """Add item under key; lower rank sorts first."""
+        node = self.root
+        node.top.append((rank, item))
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+            node.top.append((rank, item))
+
+    def finalize(self, k=TOP_K):
+        """Sort and trim every node's completions, dropping duplicates."""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            seen = set()
+            top = []
+            for rank, item in sorted(node.top, key=lambda x: x[0]):
+                if item not in seen:
+                    seen.add(item)
+                    top.append(item)
+                    if len(top) == k:
+                        break
+            node.top = top
+            stack.extend(node.children.values())
+
+    def complete(self, prefix, k=8):
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.top[:k]
+
+
+def build_completions(protocols, med_mentions):
+    """Trie over protocol IDs, titles, title words and medication names.
+
+    Items are (kind, name, label, protocol IDs), name being the protocol ID
+    or medication name. med_mentions maps medication names to the
+    protocols that mention them.
+    """
+    trie = CompletionTrie()
+    for order, p in enumerate(protocols):
+        item = (KIND_TITLE, p.id, f"{p.id} · {p.title}", (p.id,))
+        id_item = (KIND_ID,) + item[1:]
+        trie.insert(p.id.lower(), (KIND_ID, order), id_item)
+        title = p.title.lower()
+        trie.insert(title, (KIND_TITLE, 0, order), item)
+        for word in re.findall(r'[a-z0-9]+', title):
+            if len(word) > 2 and word not in STOPWORDS:
+                trie.insert(word, (KIND_TITLE, 1, order), item)
+
+    for name, ids in sorted(med_mentions.items()):
+        count = len(ids)
+        item = (KIND_MED, name, f"{name} · {count} protocol{'s' if count != 1 else ''}", tuple(ids))
+        key = name.lower()
+        trie.insert(key, (KIND_MED, 0, key), item)
+        for word in key.split()[1:]:
+            trie.insert(word, (KIND_MED, 1, key), item)
+
+    trie.finalize()
+    return trie
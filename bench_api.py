@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Load-test api.py: sustained requests per second on one core.
+
+Starts api.py in a subprocess pinned to one CPU (when there is more than
+one, the load generator runs on the others) and drives it with keep-alive
+connections for a fixed time per scenario:
+
+    protocol    GET /protocols/{id}?level=, gzip accepted
+    batch       GET /protocols?ids= with 5 IDs
+    search      GET /search?q= over a fixed set of queries
+    revalidate  the protocol requests again with If-None-Match (304s)
+    mixed       all of the above
+
+Reports requests per second, median and 99th percentile latency and the
+mean response size for each.
+
+Usage: python bench_api.py [seconds] [connections]   (default: 5 32)
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from facets import LEVELS
+from snapshot import load_snapshot
+
+API_PATH = Path(__file__).parent / "api.py"
+PORT = 8599
+
+QUERIES = ["chest pain", "cardiac arrest", "seizure", "anaphylaxis", "stroke", "overdose", "asthma",
+           "hypoglycemia", "sepsis", "burns", "mi", "svt", "naloxone", "epinephrine", "pediatric airway"]
+
+
+def start_server():
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+    pin = (lambda: os.sched_setaffinity(0, {cpus[0]})) if len(cpus) > 1 else None
+    server = subprocess.Popen([sys.executable, str(API_PATH), str(PORT)], cwd=API_PATH.parent,
+                              stdout=subprocess.PIPE, text=True, preexec_fn=pin)
+    print(server.stdout.readline().strip())
+    if len(cpus) > 1:
+        os.sched_setaffinity(0, set(cpus[1:]))
+    else:
+        print("Only one CPU: the load generator shares it with the server")
+    return server
+
+
+def targets(ids, rng):
+    protocol = [f'/protocols/{pid}?level={level}' for pid in ids for level in LEVELS]
+    batch = [f'/protocols?ids={",".join(rng.sample(ids, 5))}' for _ in range(200)]
+    search = [f'/search?q={q.replace(" ", "+")}' for q in QUERIES]
+    return {'protocol': protocol, 'batch': batch, 'search': search}
+
+
+async def fetch(reader, writer, target, etag=None):
+    """One request on a keep-alive connection: (status, etag, response size)."""
+    lines = [f'GET {target} HTTP/1.1', 'Host: localhost', 'Accept-Encoding: gzip']
+    if etag:
+        lines.append(f'If-None-Match: {etag}')
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), headers.get('etag'), len(head) + len(body)
+
+
+async def worker(requests, etags, deadline, latencies, sizes, rng):
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    try:
+        while time.perf_counter() < deadline:
+            target, revalidate = rng.choice(requests)
+            start = time.perf_counter()
+            status, etag, size = await fetch(reader, writer, target, etags.get(target) if revalidate else None)
+            latencies.append(time.perf_counter() - start)
+            sizes.append(size)
+            if status not in (200, 304):
+                raise RuntimeError(f"{target}: HTTP {status}")
+            etags[target] = etag
+    finally:
+        writer.close()
+
+
+async def warm(targets, etags):
+    """Fetch every target once, recording its ETag."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    try:
+        for target in targets:
+            _, etags[target], _ = await fetch(reader, writer, target)
+    finally:
+        writer.close()
+
+
+async def run(requests, etags, seconds, connections):
+    latencies, sizes = [], []
+    rng = random.Random(0)
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(worker(requests, etags, deadline, latencies, sizes, rng) for _ in range(connections)))
+    return latencies, sizes
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    rng = random.Random(0)
+    ids = [p.id for p in load_snapshot().corpus.protocols]
+    paths = targets(ids, rng)
+    scenarios = {
+        'protocol': [(t, False) for t in paths['protocol']],
+        'batch': [(t, False) for t in paths['batch']],
+        'search': [(t, False) for t in paths['search']],
+        'revalidate': [(t, True) for t in paths['protocol']],
+        'mixed': [(t, False) for kind in paths.values() for t in kind] + [(t, True) for t in paths['protocol']],
+    }
+
+    server = start_server()
+    try:
+        # One request per target first, so every run measures warm responses
+        # and revalidation has ETags
+        etags = {}
+        asyncio.run(warm([t for kind in paths.values() for t in kind], etags))
+        print(f"{seconds:g} s per scenario, {connections} connections\n")
+        print(f"{'scenario':12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>8}")
+        for name, requests in scenarios.items():
+            latencies, sizes = asyncio.run(run(requests, etags, seconds, connections))
+            latencies.sort()
+            p99 = latencies[int(len(latencies) * 0.99)]
+            print(f"{name:12} {len(latencies) / seconds:8.0f} {statistics.median(latencies) * 1000:8.2f} "
+                  f"{p99 * 1000:8.2f} {statistics.mean(sizes):8.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
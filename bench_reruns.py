@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Time app.py reruns: whole-script reruns against fragment reruns.
+
+Replays typing a query, switching the provider level on the list and
+switching it on a protocol page through streamlit's AppTest. AppTest always
+reruns the whole script, so fragment reruns are requested the way the
+browser requests them: with the fragment's id in the rerun request.
+
+Reports the median wall time per rerun (AppTest's own overhead included,
+so the difference is what counts) and the median bytes of forward
+messages the rerun would send to the browser.
+
+Usage: python bench_reruns.py [repeats]
+"""
+
+import statistics
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest, local_script_runner
+
+APP_PATH = Path(__file__).parent / "app.py"
+
+QUERY = "cardiac arrest"
+LEVELS = ["FR", "EMT", "AEMT", "Paramedic", "All"]
+
+
+@contextmanager
+def count_bytes(sizes):
+    """Record the size of the messages each run sends."""
+    original = local_script_runner.LocalScriptRunner.forward_msgs
+
+    def forward_msgs(runner):
+        msgs = original(runner)
+        sizes.append(sum(msg.ByteSize() for msg in msgs))
+        return msgs
+
+    local_script_runner.LocalScriptRunner.forward_msgs = forward_msgs
+    try:
+        yield
+    finally:
+        local_script_runner.LocalScriptRunner.forward_msgs = original
+
+
+@contextmanager
+def fragment_rerun(at):
+    """Make at.run() rerun only the fragments registered by the last run."""
+    ids = list(at._fragment_storage._fragments)
+    original = local_script_runner.RerunData
+    local_script_runner.RerunData = partial(original, fragment_id_queue=ids)
+    try:
+        yield
+    finally:
+        local_script_runner.RerunData = original
+
+
+def typing(at):
+    for i in range(1, len(QUERY) + 1):
+        yield lambda: at.text_input(key="search").set_value(QUERY[:i])
+
+
+def list_levels(at):
+    for level in LEVELS:
+        yield lambda: at.button_group(key="provider_level").set_value(level)
+
+
+def detail_levels(at):
+    for level in LEVELS:
+        yield lambda: at.button_group(key="detail_level").set_value(level)
+
+
+SCENARIOS = [
+    ("type a query", {}, typing),
+    ("list level switch", {}, list_levels),
+    ("detail level switch", {"p": "3.5A"}, detail_levels),
+]
+
+
+def run_scenario(params, steps, fragment):
+    """(seconds, bytes sent) for each step of a scenario."""
+    at = AppTest.from_file(str(APP_PATH), default_timeout=30)
+    for key, value in params.items():
+        at.query_params[key] = value
+    at.run()
+    times, sizes = [], []
+    for step in steps(at):
+        step()
+        with fragment_rerun(at) if fragment else nullcontext(), count_bytes(sizes):
+            start = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return list(zip(times, sizes))
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'scenario':22} {'full rerun':>20} {'fragment rerun':>20}")
+    for name, params, steps in SCENARIOS:
+        results = {}
+        for fragment in (False, True):
+            runs = []
+            for _ in range(repeats):
+                runs += run_scenario(params, steps, fragment)
+            ms = statistics.median(t for t, _ in runs) * 1000
+            kb = statistics.median(size for _, size in runs) / 1024
+            results[fragment] = f"{ms:6.1f} ms {kb:7.1f} KB"
+        print(f"{name:22} {results[False]:>20} {results[True]:>20}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Typed display blocks for protocol content.
+
+build_blocks classifies every content line once, at build time
+(build_artifacts.py). Rendering a protocol for a provider level is then a
+join over the blocks visible at that level.
+"""
+
+import re
+import sys
+from bisect import bisect_right
+from collections import namedtuple
+
+# Level hierarchy: each level can do everything below them
+LEVEL_HIERARCHY = {
+    'FR': ['FR'],
+    'E': ['FR', 'E'],
+    'A': ['FR', 'E', 'A'],
+    'P': ['FR', 'E', 'A', 'P', 'MC'],
+}
+
+# Standing-orders header level -> CSS modifier class
+STANDING_ORDER_CLASSES = {'FR': 'fr', 'E': 'emt', 'A': 'aemt', 'P': 'paramedic', 'MC': 'mc'}
+
+# Match "Protocol X.X", "Protocol X.XA", "protocol 2.3A/P" etc.
+XREF_RE = re.compile(r'[Pp]rotocol\s+(\d+\.\d+[A-Z]?(?:/[A-Z])?)')
+
+# A display block with its pre-rendered HTML, as held by the corpus
+Block = namedtuple('Block', 'type text offset level html')
+
+
+def get_section_level(line):
+    """Determine which provider level a standing orders section belongs to."""
+    if re.match(r'^(FIRST RESPONDER|FR)\s+STANDING\s+ORDER', line, re.I):
+        return 'FR'
+    elif re.match(r'^EMT\s+STANDING\s+ORDER', line, re.I):
+        return 'E'
+    elif re.match(r'^ADVANCED\s+EMT\s+STANDING\s+ORDER', line, re.I):
+        return 'A'
+    elif re.match(r'^PARAMEDIC\s+STANDING\s+ORDER', line, re.I):
+        return 'P'
+    elif re.match(r'^MEDICAL\s+CONTROL', line, re.I):
+        return 'MC'
+    return None
+
+
+def build_blocks(text):
+    """Split protocol content into typed blocks.
+
+    Each block is a dict with:
+      type    standing_orders, section, caution, note, pearl, bullet,
+              sub_bullet or plain
+      text    the text to display (bullet markers stripped)
+      offset  where text starts in the content, for search highlighting
+      level   provider level of the standing-orders section the block sits
+              in, or None when it is shown at every level
+    """
+    blocks = []
+    current_section_level = None  # Track which provider section we're in
+    pos = 0
+    for line in text.split('\n'):
+        line_start = pos
+        pos += len(line) + 1
+        stripped = line.strip()
+        if not stripped:
+            continue
+        start = line_start + len(line) - len(line.lstrip())
+        upper = stripped.upper()
+
+        # Standing orders headers open a provider section
+        section_level = get_section_level(stripped)
+        if section_level:
+            current_section_level = section_level
+
+        # Non-provider sections, cautions and notes are shown at every level
+        is_title = stripped.isupper() and len(stripped) > 4 and not stripped.startswith('•')
+        is_caution = 'CAUTION' in upper or 'RED FLAG' in upper
+        if (is_title and not section_level) or is_caution or upper.startswith(('NOTE:', 'PEARLS:', 'PEARL:')):
+            current_section_level = None
+
+        skip = 0
+        if is_caution:
+            kind = 'caution'
+        elif section_level:
+            kind = 'standing_orders'
+        elif is_title:
+            kind = 'section'
+        elif upper.startswith(('NOTE:', 'NOTE ')):
+            kind = 'note'
+        elif upper.startswith(('PEARLS:', 'PEARL:')):
+            kind = 'pearl'
+        elif stripped.startswith('•'):
+            kind, skip = 'bullet', 1
+        elif stripped.startswith(('o ', '- ')):
+            kind, skip = 'sub_bullet', 2
+        # Provider level indicators at start ("E • ...", "P Midazolam ...")
+        elif re.match(r'^[EAPFR]\s+•', stripped) or (re.match(r'^[EAPFR]\s', stripped) and len(stripped) > 3):
+            kind, skip = 'bullet', 2
+        else:
+            kind = 'plain'
+
+        rest = stripped[skip:]
+        blocks.append({
+            'type': kind,
+            'text': rest.strip(),
+            'offset': start + skip + len(rest) - len(rest.lstrip()),
+            'level': current_section_level,
+        })
+    return blocks
+
+
+def extract_cross_references(text):
+    """Extract referenced protocol IDs from text."""
+    refs = set()
+    for m in XREF_RE.finditer(text):
+        ref_id = m.group(1)
+        # Handle "3.4A/P" -> add both 3.4A and 3.4P
+        if '/' in ref_id:
+            base, suffix = ref_id.split('/')
+            # base is like "3.4A", suffix is like "P"
+            refs.add(base)
+            refs.add(base[:-1] + suffix)
+        else:
+            refs.add(ref_id)
+    return sorted(refs)
+
+
+def mark_spans(text, offset, spans):
+    """Wrap search hits in <mark>. spans are sorted content offsets; text
+    starts at content offset `offset`."""
+    end = offset + len(text)
+    i = bisect_right(spans, (offset, -1))
+    if i > 0 and spans[i - 1][1] > offset:
+        i -= 1
+    out = []
+    pos = offset
+    while i < len(spans) and spans[i][0] < end:
+        s, e = max(spans[i][0], pos), min(spans[i][1], end)
+        if s < e:
+            out.append(text[pos - offset:s - offset])
+            out.append(f'<mark>{text[s - offset:e - offset]}</mark>')
+            pos = e
+        i += 1
+    out.append(text[pos - offset:])
+    return ''.join(out)
+
+
+def highlight_ref(m):
+    return f'<span class="xref">{m.group(0)}</span>'
+
+
+def block_html(block, spans=None):
+    """HTML for one block, with cross-references and any search hits marked."""
+    text = mark_spans(block.text, block.offset, spans) if spans else block.text
+    kind = block.type
+    if kind == 'caution':
+        html = f'<div class="caution-block">⚠️ {text}</div>'
+    elif kind == 'standing_orders':
+        html = f'<div class="standing-orders {STANDING_ORDER_CLASSES[block.level]}">{text}</div>'
+    elif kind == 'section':
+        html = f'<div class="section-title">{text}</div>'
+    elif kind == 'note':
+        html = f'<div class="note-block">📝 {text}</div>'
+    elif kind == 'pearl':
+        html = f'<div class="note-block">💡 {text}</div>'
+    elif kind == 'bullet':
+        html = f'<div class="bullet">{text}</div>'
+    elif kind == 'sub_bullet':
+        html = f'<div class="sub-bullet">{text}</div>'
+    else:
+        html = f'<div class="plain">{text}</div>'
+    return XREF_RE.sub(highlight_ref, html)
+
+
+def prepare_blocks(blocks):
+    """Block records, with HTML pre-rendered once, for build_blocks dicts."""
+    records = []
+    for b in blocks:
+        level = sys.intern(b['level']) if b['level'] else None
+        block = Block(sys.intern(b['type']), b['text'], b['offset'], level, None)
+        records.append(block._replace(html=block_html(block)))
+    return tuple(records)
+
+
+def render_blocks(blocks, active_level=None, spans=None):
+    """Join the HTML of the blocks visible at active_level (None shows all).
+
+    Only blocks containing a search hit are rendered again; the rest use
+    their pre-rendered HTML.
+    """
+    allowed = LEVEL_HIERARCHY.get(active_level, ['FR', 'E', 'A', 'P', 'MC']) if active_level else None
+    parts = []
+    for block in blocks:
+        if allowed and block.level is not None and block.level not in allowed:
+            continue
+        if spans and has_hit(block, spans):
+            parts.append(block_html(block, spans))
+        else:
+            parts.append(block.html)
+    return '\n'.join(parts)
+
+
+def has_hit(block, spans):
+    start = block.offset
+    i = bisect_right(spans, (start, -1))
+    if i > 0 and spans[i - 1][1] > start:
+        return True
+    return i < len(spans) and spans[i][0] < start + len(block.text)
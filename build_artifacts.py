@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Build display artifacts from protocols_parsed.json.
+
+Run after audit_fix.py. Writes protocols_build.json, stamped with the hash of
+the parsed data it was built from, so the app can tell when it is stale. It
+holds each protocol's display blocks, the cross-reference graph, the
+TF-IDF "see also" neighbours and the medication doses the text gives. The
+run reports references that name no protocol and doses it could not parse.
+"""
+
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from blocks import build_blocks, extract_cross_references
+from medications import MEDICATIONS_PATH, extract_doses, load_medications, name_pattern
+from search_index import tokenize
+
+SOURCE_PATH = Path(__file__).parent / "protocols_parsed.json"
+BUILD_PATH = Path(__file__).parent / "protocols_build.json"
+
+# Bump when the artifact layout changes
+BUILD_FORMAT = 4
+
+# "See also" neighbours per protocol and the cosine similarity they need
+RELATED_K = 5
+RELATED_MIN_SCORE = 0.1
+
+
+def protocol_order(p):
+    """Sort key putting protocols in book order (1.0, 2.1, 2.2A, ..., 10.1)."""
+    m = re.match(r'(\d+)\.(\d+)([A-Z]?)', p['id'])
+    if m:
+        return (int(m.group(1)), int(m.group(2)), m.group(3))
+    return (99, 99, p['id'])
+
+
+def source_hash(path=SOURCE_PATH):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def resolve_reference(ref, ids):
+    """Protocol IDs a reference names: the ID itself or, for an unsuffixed
+    reference with no protocol of its own ("Protocol 2.2"), its A/P variants."""
+    if ref in ids:
+        return [ref]
+    if ref[-1].isdigit():
+        return [ref + suffix for suffix in 'AP' if ref + suffix in ids]
+    return []
+
+
+def cross_reference_graph(data):
+    """Forward and reverse reference lists per protocol, in book order, plus
+    the references of each protocol that name no protocol at all."""
+    ids = set(data)
+    order = {p['id']: i for i, p in enumerate(sorted(data.values(), key=protocol_order))}
+    refs = {pid: set() for pid in data}
+    dangling = {}
+    for pid, proto in data.items():
+        for ref in extract_cross_references(proto['content']):
+            targets = resolve_reference(ref, ids)
+            if not targets:
+                dangling.setdefault(pid, []).append(ref)
+            refs[pid].update(target for target in targets if target != pid)
+
+    referenced_by = {pid: set() for pid in data}
+    for pid, targets in refs.items():
+        for target in targets:
+            referenced_by[target].add(pid)
+    return {
+        'refs': {pid: sorted(targets, key=order.get) for pid, targets in refs.items()},
+        'referenced_by': {pid: sorted(sources, key=order.get) for pid, sources in referenced_by.items()},
+        'dangling': dangling,
+    }
+
+
+def related_protocols(data, xrefs, k=RELATED_K, min_score=RELATED_MIN_SCORE):
+    """Top-k most similar protocols by TF-IDF cosine similarity over title
+    and content, leaving out those already linked either way in xrefs."""
+    protos = sorted(data.values(), key=protocol_order)
+    ids = [p['id'] for p in protos]
+
+    # Term counts as (row, column) pairs; words only, titles count twice
+    vocab, rows, cols = {}, [], []
+    for i, p in enumerate(protos):
+        for tok in tokenize(f"{p['title']} {p['title']} {p['content']}"):
+            if len(tok) > 2 and tok.isalpha():
+                rows.append(i)
+                cols.append(vocab.setdefault(tok, len(vocab)))
+    tf = np.zeros((len(ids), len(vocab)))
+    np.add.at(tf, (rows, cols), 1)
+
+    # Sublinear tf, idf, unit rows: similarity is then a dot product
+    weights = np.log1p(tf) * np.log(len(ids) / np.count_nonzero(tf, axis=0))
+    weights /= np.maximum(np.linalg.norm(weights, axis=1, keepdims=True), 1e-12)
+    sim = weights @ weights.T
+    np.fill_diagonal(sim, 0)
+
+    related = {}
+    for i, pid in enumerate(ids):
+        linked = set(xrefs['refs'][pid]) | set(xrefs['referenced_by'][pid])
+        related[pid] = [
+            ids[j] for j in np.argsort(-sim[i], kind='stable')
+            if sim[i, j] >= min_score and ids[j] not in linked
+        ][:k]
+    return related
+
+
+def medication_doses(data, blocks, names):
+    """Doses per protocol, plus (protocol, text) for dose-like text after a
+    medication name that did not parse."""
+    names_re = name_pattern(names)
+    canonical = {name.lower(): name for name in names}
+    doses, unparsed = {}, []
+    for proto in sorted(data.values(), key=protocol_order):
+        found, missed = extract_doses(proto['id'], blocks[proto['id']], names_re, canonical)
+        doses[proto['id']] = found
+        unparsed.extend(missed)
+    return doses, unparsed
+
+
+def build(data, source):
+    blocks = {pid: build_blocks(proto['content']) for pid, proto in data.items()}
+    xrefs = cross_reference_graph(data)
+    doses, unparsed = medication_doses(data, blocks, load_medications())
+    return {
+        'format': BUILD_FORMAT,
+        'source': source,
+        'medications': source_hash(MEDICATIONS_PATH),
+        'blocks': blocks,
+        'xrefs': xrefs,
+        'related': related_protocols(data, xrefs),
+        'doses': doses,
+        'unparsed_doses': unparsed,
+    }
+
+
+def load_build(source_path=SOURCE_PATH, build_path=BUILD_PATH):
+    """The build artifact for source_path.
+
+    Falls back to building in memory when protocols_build.json is missing or
+    was built from different data or medication names.
+    """
+    source = source_hash(source_path)
+    try:
+        with open(build_path) as f:
+            artifact = json.load(f)
+        if (artifact.get('format') == BUILD_FORMAT and artifact.get('source') == source
+                and artifact.get('medications') == source_hash(MEDICATIONS_PATH)):
+            return artifact
+    except FileNotFoundError:
+        pass
+    with open(source_path) as f:
+        return build(json.load(f), source)
+
+
+def main():
+    with open(SOURCE_PATH) as f:
+        data = json.load(f)
+
+    start = time.perf_counter()
+    artifact = build(data, source_hash())
+    elapsed = time.perf_counter() - start
+    with open(BUILD_PATH, 'w') as f:
+        json.dump(artifact, f, indent=2, ensure_ascii=False)
+
+    counts = {}
+    for blocks in artifact['blocks'].values():
+        for block in blocks:
+            counts[block['type']] = counts.get(block['type'], 0) + 1
+    print(f"Built {sum(counts.values())} blocks across {len(data)} protocols:")
+    for kind, count in sorted(counts.items(), key=lambda x: -x[1]):
+        print(f"  {kind:16} {count}")
+
+    xrefs = artifact['xrefs']
+    links = sum(len(refs) for refs in xrefs['refs'].values())
+    unreferenced = [pid for pid, sources in xrefs['referenced_by'].items() if not sources]
+    print(f"Cross-references: {links} links, {len(unreferenced)} protocols never referenced")
+    if xrefs['dangling']:
+        print("Dangling references:")
+        for pid, refs in sorted(xrefs['dangling'].items(), key=lambda item: protocol_order(data[item[0]])):
+            print(f"  {pid:8} -> {', '.join(refs)}")
+    else:
+        print("No dangling references")
+
+    with_related = sum(1 for related in artifact['related'].values() if related)
+    print(f"See also: {with_related} protocols with TF-IDF neighbours")
+
+    doses = [dose for found in artifact['doses'].values() for dose in found]
+    print(f"Doses: {len(doses)} across {len({dose.medication for dose in doses})} medications")
+    if artifact['unparsed_doses']:
+        print("Unparsed doses:")
+        for pid, text in artifact['unparsed_doses']:
+            print(f"  {pid:8} {text[:70]}")
+    print(f"Built in {elapsed * 1000:.0f} ms")
+    print(f"Saved to {BUILD_PATH}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""HTML protocol cards, shared by the app list and the static export.
+
+A whole list is one HTML string of plain links, so it costs a single
+element however many protocols it shows.
+"""
+
+import html
+
+from dosing import COLOR_BANDS, WEIGHT_BANDS
+
+
+def protocol_card(proto, href, snippet=None, target=None):
+    """One linked card; snippet is optional pre-rendered HTML shown under the title."""
+    target = f' target="{target}"' if target else ''
+    snippet = f'<div class="snippet"><span>{snippet}</span></div>' if snippet else ''
+    return (f'<a class="proto-card" href="{html.escape(href)}"{target} data-id="{proto.id}">'
+            f'<span class="proto-id-badge">{proto.id}</span>'
+            f'<span class="proto-title-text">{html.escape(proto.title)}</span>'
+            f'<span class="proto-arrow">›</span>{snippet}</a>')
+
+
+def amount(low, high, unit):
+    value = f'{low:g}' if low == high else f'{low:g}–{high:g}'
+    return f'{value} {unit}'
+
+
+def dose_table(medication, doses, href, target=None):
+    """A medication's doses, one row each, linked to the protocol giving them."""
+    target = f' target="{target}"' if target else ''
+    rows = []
+    for dose in doses:
+        level = f'<span class="lvl-badge lvl-{dose.level}">{dose.level}</span>' if dose.level else ''
+        max_dose = amount(dose.max_dose, dose.max_dose, dose.max_unit) if dose.max_dose else ''
+        rows.append(f'<tr title="{html.escape(dose.text)}">'
+                    f'<td><a href="{html.escape(href(dose.protocol))}"{target}>{dose.protocol}</a></td>'
+                    f'<td>{amount(dose.low, dose.high, dose.unit)}</td>'
+                    f'<td>{"/".join(dose.routes)}</td><td>{max_dose}</td><td>{level}</td></tr>')
+    return (f'<div class="section-header">{html.escape(medication)} doses</div>'
+            '<table class="dose-table"><tr><th>Protocol</th><th>Dose</th><th>Route</th><th>Max</th><th>Level</th></tr>'
+            + ''.join(rows) + '</table>')
+
+
+def dosing_table(table, rows, by_color=False):
+    """The given rows of a dosing.DosingTable, one column per weight band or,
+    with by_color, per tape color. Amounts held down by the cap are marked."""
+    if by_color:
+        columns = range(len(WEIGHT_BANDS), len(WEIGHT_BANDS) + len(COLOR_BANDS))
+        headers = ''.join(f'<th class="band band-{band.color.lower()}" '
+                          f'title="{band.low_kg}–{band.high_kg} kg, {band.low_cm:g}–{band.high_cm:g} cm">'
+                          f'{band.color}</th>' for band in COLOR_BANDS)
+    else:
+        columns = range(len(WEIGHT_BANDS))
+        headers = ''.join(f'<th>{kg} kg</th>' for kg in WEIGHT_BANDS)
+    out = []
+    for i in rows:
+        dose = table.doses[i]
+        unit = dose.unit[:-len('/kg')]
+        max_dose = f', max {amount(dose.max_dose, dose.max_dose, dose.max_unit)}' if dose.max_dose else ''
+        label = (f'<td class="dose-label" title="{html.escape(dose.text)}">{html.escape(dose.medication)} '
+                 f'<span>{amount(dose.low, dose.high, dose.unit)} {"/".join(dose.routes)}{max_dose}</span></td>')
+        cells = ''.join(
+            f'<td class="capped" title="capped at the maximum dose">{amount(table.low[i, j], table.high[i, j], unit)}</td>'
+            if table.capped[i, j] else f'<td>{amount(table.low[i, j], table.high[i, j], unit)}</td>'
+            for j in columns)
+        out.append(f'<tr>{label}{cells}</tr>')
+    return (f'<div class="dosing-scroll"><table class="dose-table dosing-table"><tr><th></th>{headers}</tr>'
+            + ''.join(out) + '</table></div>')
+
+
+def section_label(section):
+    return section.replace('Section ', '').replace(' –', ' ·')
+
+
+def card_list(protos, href, grouped=False, snippets=None, target=None):
+    """Cards for protos, href(pid) giving each link.
+
+    grouped starts a new card group under a header at every section
+    change; snippets optionally maps protocol IDs to snippet HTML.
+    """
+    parts = []
+    current_section = None
+    for proto in protos:
+        if grouped and proto.section != current_section:
+            if current_section is not None:
+                parts.append('</div>')
+            current_section = proto.section
+            parts.append(f'<div class="section-header">{html.escape(section_label(proto.section))}</div>')
+            parts.append('<div class="proto-card-wrapper">')
+        elif not parts:
+            parts.append('<div class="proto-card-wrapper">')
+        snippet = snippets.get(proto.id) if snippets else None
+        parts.append(protocol_card(proto, href(proto.id), snippet, target))
+    if parts:
+        parts.append('</div>')
+    return '\n'.join(parts)
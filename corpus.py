@@ -0,0 +1,67 @@
+"""Immutable protocol corpus, loaded once per process and shared by reference.
+
+Protocols and their display blocks are namedtuples (no per-instance dict,
+no mutation); lists become tuples and repeated strings (IDs, sections,
+provider levels, block types) are interned, so every session and rerun
+reads the same objects.
+"""
+
+import json
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+
+from blocks import prepare_blocks
+from medications import load_dose
+from build_artifacts import SOURCE_PATH, load_build, protocol_order
+from perf import timer
+
+Protocol = namedtuple('Protocol', 'id title content pages section section_num provider_levels blocks refs referenced_by related doses')
+
+
+class Corpus:
+    """Protocols in book order plus a read-only ID lookup."""
+
+    __slots__ = ('protocols', 'by_id')
+
+    def __init__(self, protocols):
+        self.protocols = tuple(protocols)
+        self.by_id = MappingProxyType({p.id: p for p in self.protocols})
+
+    def __len__(self):
+        return len(self.protocols)
+
+    def __iter__(self):
+        return iter(self.protocols)
+
+    def __reduce__(self):
+        return Corpus, (self.protocols,)
+
+
+def load_corpus(path=SOURCE_PATH):
+    with timer('load.json'), open(path) as f:
+        data = json.load(f)
+    with timer('load.build'):
+        artifact = load_build(path)
+    blocks, xrefs = artifact['blocks'], artifact['xrefs']
+    with timer('load.sort'):
+        ordered = sorted(data.values(), key=protocol_order)
+
+    intern = sys.intern
+    protocols = []
+    for p in ordered:
+        protocols.append(Protocol(
+            id=intern(p['id']),
+            title=p['title'],
+            content=p['content'],
+            pages=tuple(p.get('pages', ())),
+            section=intern(p.get('section', 'Other')),
+            section_num=intern(p.get('section_num', '')),
+            provider_levels=tuple(intern(level) for level in p.get('provider_levels', ())),
+            blocks=prepare_blocks(blocks[p['id']]),
+            refs=tuple(intern(ref) for ref in xrefs['refs'][p['id']]),
+            referenced_by=tuple(intern(ref) for ref in xrefs['referenced_by'][p['id']]),
+            related=tuple(intern(pid) for pid in artifact['related'][p['id']]),
+            doses=tuple(load_dose(dose) for dose in artifact['doses'][p['id']]),
+        ))
+    return Corpus(protocols)
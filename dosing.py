@@ -0,0 +1,201 @@
+"""Weight-band and color-band dosing tables for pediatric protocols.
+
+Every per-kg dose (see medications.extract_doses) given for children, in a
+unit that fits its medication (see pediatric_doses), is computed for each
+weight band and each length-based tape color in one NumPy batch per
+version: amount per kg times weight, capped at the
+protocol's maximum, rounded to what can be drawn up. The snapshot holds the
+results, so the detail view only looks them up.
+"""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from medications import CAP_WORD_RE, DOSE_RE, unit_name
+
+# Weights in kg the weight table has a column for
+WEIGHT_BANDS = (3, 4, 5, 6, 8, 10, 12, 14, 16, 18, 20, 25, 30, 35, 40)
+
+ColorBand = namedtuple('ColorBand', 'color low_kg high_kg low_cm high_cm')
+
+# Length-based resuscitation tape zones; a zone is dosed at its middle weight
+COLOR_BANDS = (
+    ColorBand('Grey', 3, 5, 46.8, 60.8),
+    ColorBand('Pink', 6, 7, 60.8, 67.8),
+    ColorBand('Red', 8, 9, 67.8, 75.3),
+    ColorBand('Purple', 10, 11, 75.3, 85.0),
+    ColorBand('Yellow', 12, 14, 85.0, 98.3),
+    ColorBand('White', 15, 18, 98.3, 110.8),
+    ColorBand('Blue', 19, 23, 110.8, 122.5),
+    ColorBand('Orange', 24, 29, 122.5, 137.5),
+    ColorBand('Green', 30, 36, 137.5, 146.5),
+)
+
+# Mass units a cap may be given in, relative to mg
+MASS_UNITS = {'mcg': 0.001, 'mg': 1.0, 'g': 1000.0}
+
+# What a medication's doses measure, where it is not mass (mcg/mg/g);
+# anything else, such as a per-kg volume, is not a dose of it
+DOSE_DIMENSIONS = {
+    'Heparin': 'units',
+    'Insulin': 'units',
+    'Oxytocin': 'units',
+    'Sodium Bicarbonate': 'mEq',
+}
+
+# Age labels in protocol text ("ADULT: 0.1 mg/kg", "PEDI: 70 mg/kg")
+AGE_MARKER_RE = re.compile(r'\b(ADULTS?|PEDI(?:ATRICS?)?|PEDS|CHILD(?:REN)?)\b')
+# Ages in titles and headings ("Seizures – Pediatric", "ADULT STANDING ORDERS")
+AGE_WORD_RE = re.compile(r'\b(adults?|pedi(?:atrics?)?|peds|child(?:ren)?|newly\s+born|newborns?|neonat\w*)\b', re.I)
+
+# Block types that head what follows them
+HEADING_TYPES = ('section', 'standing_orders')
+
+# A protocol's table: its per-kg doses, and for each dose (rows) and band
+# (columns, weight bands then color bands) the low and high amounts and
+# whether the cap applied
+DosingTable = namedtuple('DosingTable', 'doses low high capped')
+
+
+def band_weights():
+    return np.array([*WEIGHT_BANDS, *((band.low_kg + band.high_kg) / 2 for band in COLOR_BANDS)])
+
+
+def cap_per_unit(dose):
+    """(cap, per_kg) in the dose's own unit; cap is inf when there is none or
+    it is given in a unit the dose cannot be converted to."""
+    unit = dose.unit[:-len('/kg')]
+    if not dose.max_dose:
+        return np.inf, False
+    if dose.max_unit == dose.unit:
+        return dose.max_dose, True
+    if dose.max_unit == unit:
+        return dose.max_dose, False
+    if dose.max_unit in MASS_UNITS and unit in MASS_UNITS:
+        return dose.max_dose * MASS_UNITS[dose.max_unit] / MASS_UNITS[unit], False
+    return np.inf, False
+
+
+def cap_known(dose):
+    """False when the dose's text states a maximum the table cannot apply:
+    one extract_doses could not read, or one in a unit the dose cannot be
+    converted to. Such a dose gets no row rather than an uncapped one."""
+    if not dose.max_dose:
+        return not CAP_WORD_RE.search(dose.text)
+    return bool(np.isfinite(cap_per_unit(dose)[0]))
+
+
+def dimension(unit):
+    """What a unit measures: 'mass' for mcg/mg/g, else the unit itself."""
+    base = unit.split('/')[0]
+    return 'mass' if base in MASS_UNITS else base
+
+
+def age_label(dose):
+    """'adult' or 'pediatric' when the dose's text labels the age it is for
+    (the last label before the dose), else None."""
+    label = None
+    for m in DOSE_RE.finditer(dose.text):
+        low, high, unit, per_kg, per_time = m.groups()
+        if float(low) == dose.low and unit_name(unit, per_kg, per_time) == dose.unit:
+            markers = AGE_MARKER_RE.findall(dose.text, 0, m.start())
+            if markers:
+                label = 'adult' if markers[-1].startswith('ADULT') else 'pediatric'
+            break
+    return label
+
+
+def text_age(text):
+    """'adult' or 'pediatric' when a title or heading names just one of
+    the two, else None."""
+    ages = {'adult' if word.lower().startswith('adult') else 'pediatric' for word in AGE_WORD_RE.findall(text)}
+    return ages.pop() if len(ages) == 1 else None
+
+
+def dose_ages(proto):
+    """The age each of proto's doses is given for: the dose's own label
+    (see age_label), else the heading it sits under, else the protocol's
+    title; None when none of them says."""
+    headings, heading = [], None
+    for block in proto.blocks:
+        if block.type in HEADING_TYPES:
+            heading = text_age(block.text)
+        headings.append(heading)
+    title = text_age(proto.title)
+    # Doses are in block order; a dose's text starts as its block's does
+    ages, start = [], 0
+    for dose in proto.doses:
+        key = dose.text[:24]
+        found = next((i for i in range(start, len(proto.blocks)) if key in proto.blocks[i].text), None)
+        if found is not None:
+            start = found
+        ages.append(age_label(dose) or (headings[found] if found is not None else None) or title)
+    return ages
+
+
+def pediatric_doses(protocols):
+    """(protocol id, dose) for the per-kg doses the weight tables cover.
+
+    A dose qualifies when it is given for children (see dose_ages; an
+    unlabelled dose in a protocol for both ages is not), and its unit
+    measures what that medication is
+    dosed in (DOSE_DIMENSIONS), so dextrose grams credited to insulin, or a
+    fluid volume, never become a row. A dose whose maximum cannot be
+    applied (see cap_known) is left out too.
+    """
+    return [(p.id, dose) for p in protocols
+            for dose, age in zip(p.doses, dose_ages(p))
+            if age == 'pediatric'
+            and dose.unit.endswith('/kg')
+            and dimension(dose.unit) == DOSE_DIMENSIONS.get(dose.medication, 'mass')
+            and cap_known(dose)]
+
+
+def round_half_up(amounts, decimals):
+    # The epsilon keeps binary representation (1.45 * 10 = 14.4999...) from
+    # rounding a written half down
+    scale = 10.0 ** decimals
+    return np.floor(amounts * scale + 0.5 + 1e-9) / scale
+
+
+def round_dose(amounts):
+    """Whole units from 10 up, tenths from 1, hundredths below; halves round up."""
+    return np.where(amounts >= 10, round_half_up(amounts, 0),
+                    np.where(amounts >= 1, round_half_up(amounts, 1), round_half_up(amounts, 2)))
+
+
+def dosing_tables(protocols):
+    """{protocol id: DosingTable} for every protocol with pediatric per-kg
+    doses (see pediatric_doses)."""
+    rows = pediatric_doses(protocols)
+    if not rows:
+        return {}
+
+    weights = band_weights()
+    low = np.array([dose.low for _, dose in rows])[:, None]
+    high = np.array([dose.high for _, dose in rows])[:, None]
+    caps = [cap_per_unit(dose) for _, dose in rows]
+    cap = np.array([c for c, _ in caps])[:, None]
+    per_kg = np.array([p for _, p in caps])[:, None]
+    cap = np.where(per_kg, cap * weights, cap)
+
+    low_amounts = low * weights
+    high_amounts = high * weights
+    capped = high_amounts > cap
+    low_amounts = round_dose(np.minimum(low_amounts, cap))
+    high_amounts = round_dose(np.minimum(high_amounts, cap))
+
+    tables = {}
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or rows[i][0] != rows[start][0]:
+            tables[rows[start][0]] = DosingTable(
+                doses=tuple(dose for _, dose in rows[start:i]),
+                low=low_amounts[start:i],
+                high=high_amounts[start:i],
+                capped=capped[start:i],
+            )
+            start = i
+    return tables
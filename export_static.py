@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Export the protocol book as a static, offline-capable site.
+
+Every protocol is pre-rendered at every provider level, the list page
+searches a compact serialized index in the browser (static/search.js), and
+a service worker caches the whole folder on first load so it keeps working
+with no connection. Serve the folder over http(s); service workers do not
+run from file:// URLs.
+
+Usage: python export_static.py [output_dir]   (default: dist/)
+"""
+
+import hashlib
+import html
+import json
+import shutil
+import sys
+from pathlib import Path
+
+from blocks import render_blocks
+from cards import card_list
+from corpus import load_corpus
+from search_index import ID_EXACT_BOOST, ID_PREFIX_BOOST, MAX_PREFIX_EXPANSIONS, PREFIX_WEIGHT, \
+    SYNONYM_PROTOCOL_BOOST, SearchIndex
+from synonyms import load_synonyms
+
+STATIC_DIR = Path(__file__).parent / "static"
+
+# Provider levels as (file suffix, label); None is the unfiltered page
+LEVELS = [(None, 'All'), ('FR', 'FR'), ('E', 'EMT'), ('A', 'AEMT'), ('P', 'Paramedic')]
+LEVEL_BITS = {'FR': 1, 'E': 2, 'A': 4, 'P': 8}
+
+# Postings scores are shipped as integers in hundredths
+SCORE_SCALE = 100
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="{root}app.css">
+</head>
+<body>
+<main class="block-container">
+{body}
+</main>
+<script>
+if ('serviceWorker' in navigator) navigator.serviceWorker.register('{root}sw.js');
+</script>
+{scripts}
+</body>
+</html>
+"""
+
+
+def page_name(pid, level=None):
+    return f"{pid}.{level}.html" if level else f"{pid}.html"
+
+
+def level_bits(proto):
+    levels = proto.provider_levels
+    if 'ALL' in levels:
+        return sum(LEVEL_BITS.values())
+    return sum(LEVEL_BITS.get(level, 0) for level in levels)
+
+
+def render_index(protos):
+    parts = [
+        '<div class="app-title">🚑 MA EMS Protocols</div>',
+        '<div class="app-subtitle">Statewide Treatment Protocols · v2026.1</div>',
+        '<nav class="level-selector" id="levels">',
+    ]
+    for level, label in LEVELS:
+        active = ' active' if level is None else ''
+        parts.append(f'<a class="level-pill{active}" href="#" data-level="{level or ""}">{label}</a>')
+    parts.append('</nav>')
+    parts.append('<input id="search" class="search-box" type="search" placeholder="Search protocols..." autocomplete="off">')
+    parts.append('<div id="count" class="result-count"></div>')
+    parts.append('<div id="results" class="proto-card-wrapper" hidden></div>')
+    parts.append('<div id="none" class="no-results" hidden>No protocols found.<br>Try different keywords.</div>')
+
+    # Grouped by section; search.js hides this while a query is active
+    parts.append('<div id="list">')
+    parts.append(card_list(protos, lambda pid: f"p/{page_name(pid)}", grouped=True))
+    parts.append('</div>')
+    return PAGE.format(
+        title='MA EMS Protocols',
+        root='',
+        body='\n'.join(parts),
+        scripts='<script src="search.js"></script>',
+    )
+
+
+def render_protocol(proto, level, protocols_dict):
+    pid = proto.id
+    parts = [
+        '<a class="back-link" href="../index.html">← Back</a>',
+        f'<div class="detail-header">{pid} — {html.escape(proto.title)}</div>',
+    ]
+    badges = " ".join(f'<span class="lvl-badge lvl-{l}">{l}</span>' for l in proto.provider_levels)
+    parts.append(f'<div class="detail-badges">{badges}</div>')
+
+    parts.append('<nav class="level-selector">')
+    for other, label in LEVELS:
+        active = ' active' if other == level else ''
+        parts.append(f'<a class="level-pill{active}" href="{page_name(pid, other)}">{label}</a>')
+    parts.append('</nav>')
+    parts.append('<div class="thin-divider"></div>')
+    parts.append(f'<div class="protocol-body">{render_blocks(proto.blocks, active_level=level)}</div>')
+
+    for heading, ids in (('Referenced Protocols', proto.refs), ('Referenced By', proto.referenced_by),
+                         ('See Also', proto.related)):
+        if ids:
+            parts.append('<div class="thin-divider"></div>')
+            parts.append(f'<div class="section-header">{heading}</div>')
+            parts.append(card_list([protocols_dict[r] for r in ids], lambda pid: page_name(pid, level)))
+    return PAGE.format(
+        title=f'{pid} {html.escape(proto.title)}',
+        root='../',
+        body='\n'.join(parts),
+        scripts='',
+    )
+
+
+def serialize_index(protos, index, synonyms):
+    """Compact JSON form of the BM25 index for static/search.js.
+
+    Vocabulary tokens are sorted so the client can prefix-search them with a
+    binary search. Each postings list is flat [doc gap, score, ...] with
+    scores as integers; synonyms are flattened to phrase -> expansions.
+    """
+    postings = []
+    for tok in index.vocab:
+        flat, prev = [], 0
+        for doc in sorted(index.postings[tok]):
+            flat.append(doc - prev)
+            flat.append(round(index.postings[tok][doc] * SCORE_SCALE))
+            prev = doc
+        postings.append(flat)
+    return {
+        'docs': [[p.id, p.title, level_bits(p)] for p in protos],
+        'terms': index.vocab,
+        'postings': postings,
+        'synonyms': {
+            ' '.join(phrase): [[' '.join(alt) for alt in expansions], list(pids)]
+            for phrase, expansions, pids in synonyms.phrases()
+        },
+        'params': {
+            'scoreScale': SCORE_SCALE,
+            'idExactBoost': ID_EXACT_BOOST,
+            'idPrefixBoost': ID_PREFIX_BOOST,
+            'maxPrefixExpansions': MAX_PREFIX_EXPANSIONS,
+            'prefixWeight': PREFIX_WEIGHT,
+            'synonymProtocolBoost': SYNONYM_PROTOCOL_BOOST,
+            'levelBits': LEVEL_BITS,
+        },
+    }
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def main():
+    out = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "dist"
+
+    corpus = load_corpus()
+    protos, protocols_dict = corpus.protocols, corpus.by_id
+
+    if out.exists():
+        shutil.rmtree(out)
+
+    write(out / "index.html", render_index(protos))
+    for proto in protos:
+        for level, _ in LEVELS:
+            write(out / "p" / page_name(proto.id, level), render_protocol(proto, level, protocols_dict))
+
+    synonyms = load_synonyms()
+    index = SearchIndex(protos, synonyms=synonyms)
+    write(out / "search.json", json.dumps(serialize_index(protos, index, synonyms), separators=(',', ':'), ensure_ascii=False))
+    shutil.copy(STATIC_DIR / "app.css", out / "app.css")
+    shutil.copy(STATIC_DIR / "search.js", out / "search.js")
+
+    # The service worker precaches every file; its cache name changes with
+    # the content so a new export replaces the old cache
+    files = sorted(path.relative_to(out).as_posix() for path in out.rglob('*') if path.is_file())
+    digest = hashlib.sha256()
+    for name in files:
+        digest.update(name.encode())
+        digest.update((out / name).read_bytes())
+    sw = (STATIC_DIR / "sw.js").read_text()
+    sw = sw.replace('__CACHE_NAME__', f'protocols-{digest.hexdigest()[:12]}')
+    sw = sw.replace('__FILES__', json.dumps(['./'] + files, indent=2))
+    write(out / "sw.js", sw)
+
+    total = sum((out / name).stat().st_size for name in files)
+    print(f"Exported {len(protos)} protocols x {len(LEVELS)} levels ({len(files)} files, {total / 1024:.0f} KB)")
+    print(f"Search index: {(out / 'search.json').stat().st_size / 1024:.0f} KB")
+    print(f"Saved to {out}")
+
+
+if __name__ == '__main__':
+    main()
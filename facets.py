@@ -0,0 +1,89 @@
+"""Bitset facets for filtering the protocol list.
+
+Bit i of every mask stands for the i-th protocol in display order, so any
+combination of facet values resolves with a bitwise AND and a count is a
+popcount.
+"""
+
+LEVELS = ('FR', 'E', 'A', 'P')
+AGES = ('Adult', 'Pediatric')
+
+
+def age_group(pid):
+    """'A'/'P' suffixed IDs are age-specific; unsuffixed ones cover both."""
+    if '.' in pid and pid[-1] == 'A':
+        return ('Adult',)
+    if '.' in pid and pid[-1] == 'P':
+        return ('Pediatric',)
+    return AGES
+
+
+class FacetIndex:
+    """Precomputed per-value bitsets for level, section, age and medication."""
+
+    def __init__(self, protocols, med_mentions):
+        self.ids = [p.id for p in protocols]
+        self.bit = {pid: 1 << i for i, pid in enumerate(self.ids)}
+        self.all = (1 << len(self.ids)) - 1
+        self.facets = {
+            'level': dict.fromkeys(LEVELS, 0),
+            'section': {},
+            'age': dict.fromkeys(AGES, 0),
+            'medication': {},
+        }
+
+        for p in protocols:
+            bit = self.bit[p.id]
+            levels = p.provider_levels
+            for level in LEVELS:
+                if level in levels or 'ALL' in levels:
+                    self.facets['level'][level] |= bit
+            section = p.section
+            self.facets['section'][section] = self.facets['section'].get(section, 0) | bit
+            for age in age_group(p.id):
+                self.facets['age'][age] |= bit
+
+        for name, ids in sorted(med_mentions.items()):
+            self.facets['medication'][name] = self.mask_of(ids)
+
+    def mask_of(self, ids):
+        mask = 0
+        for pid in ids:
+            mask |= self.bit.get(pid, 0)
+        return mask
+
+    def mask(self, selection, skip=None):
+        """AND of the selected value of every facet except skip.
+
+        selection maps facet name to a value, or None for no filter.
+        """
+        mask = self.all
+        for facet, value in selection.items():
+            if value is not None and facet != skip:
+                mask &= self.facets[facet].get(value, 0)
+        return mask
+
+    def counts(self, facet, selection, base=None):
+        """Matches per value of one facet, given the other selections.
+
+        base optionally restricts the counts further (e.g. to search hits).
+        Returns ({value: count}, count with this facet unfiltered).
+        """
+        mask = self.mask(selection, skip=facet)
+        if base is not None:
+            mask &= base
+        counts = {value: (bits & mask).bit_count() for value, bits in self.facets[facet].items()}
+        return counts, mask.bit_count()
+
+    def members(self, mask):
+        """Protocol IDs in a mask, in display order."""
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(self.ids[low.bit_length() - 1])
+            mask ^= low
+        return ids
+
+    def select(self, ids, mask):
+        """Keep the IDs in mask, preserving their (ranked) order."""
+        return [pid for pid in ids if self.bit.get(pid, 0) & mask]
@@ -0,0 +1,183 @@
+"""Medication names, and the doses the protocols give for them.
+
+The names drive quick-jump completions and filtering. extract_doses pulls
+each dose that follows a medication name in a protocol's display blocks
+into a structured record; the build runs it once per protocol and reports
+the dose-like strings it could not parse.
+"""
+
+import json
+import re
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+MEDICATIONS_PATH = Path(__file__).parent / "medications.json"
+
+Dose = namedtuple('Dose', 'medication low high unit routes max_dose max_unit level protocol text')
+
+# "0.1", "2-4", "2 - 4", "0.1 to 1"
+AMOUNT = r'(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:\.\d+)?))?'
+# mg, mcg, grams, units, mEq, mL, J, tabs/sprays/tubes; optionally per kg (the
+# PDF text sometimes drops the slash: "0.1 mg kg", or spells it "per kg")
+# and per minute/hour. A unit followed by any other "/" is not read:
+# concentrations (mg/mL), lab values (mg/dL) and rates the PDF text broke
+# apart ("2-10 mcg/ infusion").
+UNIT = (r'(mcg|mg|grams?|gm|g|units?|meq|ml|j|tab(?:let)?s?(?:/spray)?|sprays?|tubes?)'
+        r'(?:(?:\s*/\s*|\s+(?:per\s+)?)(kg))?(?:\s*(?:/|per)\s*(min(?:ute)?|h(?:ou)?r))?\b(?!\s*/)')
+DOSE_RE = re.compile(AMOUNT + r'\s*' + UNIT, re.I)
+# "2 mcg to 10 mcg per minute" is the range "2 to 10 mcg per minute"
+UNIT_RANGE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(mcg|mg|g|units?|meq|ml)\s*(?:-|–|to)\s*(?=\d+(?:\.\d+)?\s*\2\b)', re.I)
+MAX_RE = re.compile(r'(?:max(?:imum|\.)?(?:\s+(?:single|total|individual))?(?:\s+dose)?(?:\s+of)?|'
+                    r'up\s+to(?:\s+(?:a\s+)?total(?:\s+dose)?(?:\s+of)?)?)\s*'
+                    r'(\d+(?:\.\d+)?)\s*' + UNIT, re.I)
+# A maximum dose is stated, whether or not MAX_RE can read it ("maximum 3
+# doses" is a count, not a dose)
+CAP_WORD_RE = re.compile(r'\bmax(?:imum)?\b(?!\.?\s*(?:of\s+)?\d+\s*(?:doses|times)\b)|\btotal\s+dose\b', re.I)
+# The end of a sentence; "kg." and "max." are abbreviations, not ends
+SENTENCE_END_RE = re.compile(r'(?<=[a-z)])(?<!\bkg)(?<!\bmax)\.\s')
+ROUTES_RE = re.compile(r'^[\s,(]*(?:slow\s+)?((?:IV|IO|IM|IN|SL|PO|ET|SQ|SC|NEB|ODT|PR)(?:\s*/\s*(?:IV|IO|IM|IN|SL|PO|ET|SQ|SC|NEB|ODT|PR))*)\b', re.I)
+# What may stand between a name and its dose: punctuation, strengths
+# ("Dextrose 10%"), salt and formulation words, how it is given
+# ("infusion at a rate of") and an age label
+LEAD_RE = re.compile(r'(?:[\s:,–-]|\d+(?:\.\d+)?\s*%|\b(?:sulfate|hcl|hydrochloride|chloride|gluconate|'
+                     r'bicarbonate|citrate|tartrate|continuous|infusion|drip|auto[\s-]?injector|'
+                     r'at(?:\s+a\s+rate\s+of)?|initial\s+dose|adult|pediatric|peds)\b)*', re.I)
+# Where a dose's clause ends: what follows is another treatment (a fluid
+# bolus, a flush, the diluent the drug is mixed in, another order after ";"
+# unless it is another dose of the same drug: "; or 10 mg IN")
+CLAUSE_END_RE = re.compile(r';(?!\s*(?:and/)?or\s+\d)|\bfollowed\s+by\b|\bfluids?\b|\bbolus\b|\bflush\b|'
+                           r'\bin\s+(?:\d+(?:\.\d+)?\s*ml\s+(?:of\s+)?)?(?:normal\s+saline|ns|sterile\s+water)\b', re.I)
+ROUTE_WORDS = {'sublingual': 'SL', 'intranasal': 'IN', 'nebulized': 'NEB', 'by mouth': 'PO', 'orally': 'PO'}
+
+# How far past a medication name its dose may appear, in characters
+DOSE_WINDOW = 120
+
+UNIT_NAMES = {
+    'gram': 'g', 'grams': 'g', 'gm': 'g', 'unit': 'units', 'meq': 'mEq', 'ml': 'mL', 'j': 'J',
+    'tabs': 'tab', 'tablet': 'tab', 'tablets': 'tab', 'tab/spray': 'tab', 'sprays': 'spray', 'tubes': 'tube',
+}
+
+
+def load_medications(path=MEDICATIONS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def unit_name(unit, per_kg, per_time):
+    unit = UNIT_NAMES.get(unit.lower(), unit.lower())
+    if per_kg:
+        unit += '/kg'
+    if per_time:
+        unit += '/min' if per_time.lower().startswith('min') else '/hr'
+    return unit
+
+
+def routes_after(text):
+    """Routes written right after a dose ("IV/IO", "slow IV", "sublingual")."""
+    m = ROUTES_RE.match(text)
+    if m:
+        return tuple(route.strip().upper() for route in m.group(1).split('/'))
+    head = text[:30].lower()
+    return tuple(route for word, route in ROUTE_WORDS.items() if word in head)
+
+
+def name_pattern(names):
+    """One regex matching any of names as whole words, longest first."""
+    alternatives = '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(rf'\b({alternatives})\b', re.I)
+
+
+def extract_doses(pid, blocks, names_re, canonical):
+    """(doses, unparsed) for one protocol's build_blocks dicts.
+
+    A dose must follow the name directly (see LEAD_RE); further doses are
+    read up to the end of its clause, within the sentence and before the
+    next medication name (at most DOSE_WINDOW characters). Dose-like text
+    after a name that does not follow it that way, or a clause stating a
+    maximum MAX_RE cannot read, is returned in unparsed rather than
+    guessed at.
+    """
+    doses, unparsed = [], []
+    for block in blocks:
+        text = block['text']
+        mentions = list(names_re.finditer(text))
+        for i, mention in enumerate(mentions):
+            end = mentions[i + 1].start() if i + 1 < len(mentions) else len(text)
+            window = text[mention.end():min(end, mention.end() + DOSE_WINDOW)]
+            # The sentence the dose belongs to, less asides like
+            # "(10ml of a 0.1mg/ml solution)" but keeping a maximum written
+            # as one ("(maximum individual 5 mg)"); later sentences are
+            # other orders
+            window = SENTENCE_END_RE.split(window, maxsplit=1)[0]
+            window = re.sub(r'\(([^)]*)\)', lambda m: f' {m.group(1)} ' if CAP_WORD_RE.search(m.group(1)) else ' ',
+                            window)
+            dose_text = (mention.group(0) + window).strip()
+            window = UNIT_RANGE_RE.sub(r'\1 to ', window)
+            lead = LEAD_RE.match(window).end()
+            clause_end = CLAUSE_END_RE.search(window, lead)
+            clause = window[:clause_end.start()] if clause_end else window
+            first = DOSE_RE.match(clause, lead)
+            max_match = MAX_RE.search(clause)
+            if not first or (CAP_WORD_RE.search(clause) and not max_match):
+                if DOSE_RE.search(window) or re.match(r'[\s:,–-]*\d', window):
+                    unparsed.append((pid, dose_text))
+                continue
+            # Routes may follow a maximum: "70 mg/kg (to maximum 5 grams) IV/IO"
+            route_text = clause
+            if max_match:
+                start = re.search(r'(?:\bto\s+(?:a\s+)?)?$', clause[:max_match.start()]).start()
+                route_text = clause[:start] + ' ' * (max_match.end() - start) + clause[max_match.end():]
+            for m in DOSE_RE.finditer(clause, lead):
+                if max_match and max_match.start() <= m.start() < max_match.end():
+                    continue
+                low, high, unit, per_kg, per_time = m.groups()
+                doses.append(Dose(
+                    medication=canonical[mention.group(1).lower()],
+                    low=float(low),
+                    high=float(high) if high else float(low),
+                    unit=unit_name(unit, per_kg, per_time),
+                    routes=routes_after(route_text[m.end():]),
+                    max_dose=float(max_match.group(1)) if max_match else None,
+                    max_unit=unit_name(*max_match.groups()[1:]) if max_match else None,
+                    level=block['level'],
+                    protocol=pid,
+                    text=dose_text,
+                ))
+    return doses, unparsed
+
+
+def load_dose(record):
+    """A Dose from its JSON form in the build artifact."""
+    dose = Dose._make(record)
+    intern = sys.intern
+    return dose._replace(
+        medication=intern(dose.medication),
+        unit=intern(dose.unit),
+        routes=tuple(intern(route) for route in dose.routes),
+        level=intern(dose.level) if dose.level else None,
+        protocol=intern(dose.protocol),
+    )
+
+
+def dose_index(protocols):
+    """Medication name -> every dose given for it, in protocol order."""
+    index = {}
+    seen = set()
+    for p in protocols:
+        for dose in p.doses:
+            key = dose[:8] + (dose.protocol,)
+            if key not in seen:
+                seen.add(key)
+                index.setdefault(dose.medication, []).append(dose)
+    return {name: tuple(doses) for name, doses in sorted(index.items())}
+
+
+def medication_mentions(search_index, names):
+    """Map each medication name to the protocol IDs that mention it."""
+    mentions = {}
+    for name in names:
+        ids = search_index.phrase_ids(name)
+        if ids:
+            mentions[name] = ids
+    return mentions
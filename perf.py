@@ -0,0 +1,122 @@
+"""Latency histograms for the app's hot paths.
+
+Timings are bucketed into fixed log-spaced histograms, so recording is a
+couple of perf_counter calls, a bisect and a locked increment, and memory
+does not grow with traffic. Cheap enough to leave on in production.
+
+Set PROTOCOLS_PERF_LOG to a file path to also append every timing to it as
+a JSON line.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+LOG_PATH = os.environ.get('PROTOCOLS_PERF_LOG')
+
+# Bucket upper bounds in ms, four per doubling from 1 µs to about 70 s;
+# percentiles are reported as the upper bound of their bucket (+19% at worst)
+BUCKETS = tuple(0.001 * 2 ** (i / 4) for i in range(65))
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile, in ms."""
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class Timer:
+    """Context manager recording its block's duration under path."""
+
+    __slots__ = ('timings', 'path', 'start')
+
+    def __init__(self, timings, path):
+        self.timings = timings
+        self.path = path
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timings.record(self.path, time.perf_counter() - self.start)
+
+
+class Timings:
+    """Per-path histograms shared by every session in the process."""
+
+    def __init__(self, log_path=LOG_PATH):
+        self.lock = threading.Lock()
+        self.paths = {}
+        self.log = open(log_path, 'a', buffering=1) if log_path else None
+
+    def record(self, path, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            hist = self.paths.get(path)
+            if hist is None:
+                hist = self.paths[path] = Histogram()
+            hist.add(ms)
+            if self.log:
+                self.log.write(json.dumps({'ts': round(time.time(), 3), 'path': path, 'ms': round(ms, 4)}) + '\n')
+
+    def timer(self, path):
+        return Timer(self, path)
+
+    def timed(self, path):
+        """Decorator form of timer."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(path):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """One row per path: count, mean, p50/p95/p99 and max in ms."""
+        with self.lock:
+            return [
+                {
+                    'path': path,
+                    'count': hist.count,
+                    'mean': hist.total / hist.count,
+                    'p50': hist.percentile(50),
+                    'p95': hist.percentile(95),
+                    'p99': hist.percentile(99),
+                    'max': hist.max,
+                }
+                for path, hist in sorted(self.paths.items())
+            ]
+
+    def reset(self):
+        with self.lock:
+            self.paths.clear()
+
+
+timings = Timings()
+timer = timings.timer
+timed = timings.timed
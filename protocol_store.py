@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""SQLite store holding every live protocol version in one file.
+
+Protocols are keyed by (version, id). Listing a version reads only the
+metadata columns; content and display blocks are fetched one protocol at a
+time when a detail view opens, so versions other than the current one are
+never loaded whole. An FTS5 table over title and content serves their search.
+ProtocolCache keeps recently opened protocols, and prefetches the ones an
+open protocol references, so following a reference skips the store.
+
+Run after build_artifacts.py to import parsed protocols as a version:
+
+Usage: python protocol_store.py [version] [parsed_json]   (default: 2026.1, protocols_parsed.json)
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from blocks import prepare_blocks
+from build_artifacts import SOURCE_PATH, load_build, protocol_order, source_hash
+from corpus import Corpus, Protocol
+from medications import load_dose
+from search_index import FIELD_BOOSTS, tokenize
+
+STORE_PATH = Path(__file__).parent / "protocols.db"
+
+# The version protocols_parsed.json holds
+CURRENT_VERSION = '2026.1'
+
+# Bump when the schema changes; a writer drops tables of any other format
+STORE_FORMAT = 4
+
+# content and blocks come last so metadata reads stop before their overflow pages
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    imported REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS protocols (
+    version TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    section TEXT NOT NULL,
+    section_num TEXT NOT NULL,
+    provider_levels TEXT NOT NULL,
+    pages TEXT NOT NULL,
+    refs TEXT NOT NULL,
+    referenced_by TEXT NOT NULL,
+    related TEXT NOT NULL,
+    doses TEXT NOT NULL,
+    content TEXT NOT NULL,
+    blocks TEXT NOT NULL,
+    PRIMARY KEY (version, id)
+);
+CREATE INDEX IF NOT EXISTS protocols_order ON protocols (version, position);
+CREATE VIRTUAL TABLE IF NOT EXISTS protocol_text USING fts5(
+    title, content, content='protocols', content_rowid='rowid'
+);
+"""
+
+DROP_TABLES = """
+DROP TABLE IF EXISTS protocol_text;
+DROP TABLE IF EXISTS protocols;
+DROP TABLE IF EXISTS versions;
+"""
+
+HEADER_COLUMNS = 'id, title, pages, section, section_num, provider_levels, refs, referenced_by, related, doses'
+
+
+def header(row):
+    pid, title, pages, section, section_num, levels, refs, referenced_by, related, doses = row
+    intern = sys.intern
+    return Protocol(
+        id=intern(pid),
+        title=title,
+        content='',
+        pages=tuple(json.loads(pages)),
+        section=intern(section),
+        section_num=intern(section_num),
+        provider_levels=tuple(intern(level) for level in json.loads(levels)),
+        blocks=(),
+        refs=tuple(intern(ref) for ref in json.loads(refs)),
+        referenced_by=tuple(intern(ref) for ref in json.loads(referenced_by)),
+        related=tuple(intern(pid) for pid in json.loads(related)),
+        doses=tuple(load_dose(dose) for dose in json.loads(doses)),
+    )
+
+
+class ProtocolStore:
+    """Protocol versions in one SQLite file, with a connection per thread."""
+
+    def __init__(self, path=STORE_PATH, readonly=False):
+        self.path = Path(path)
+        self.readonly = readonly
+        self.local = threading.local()
+
+    @property
+    def db(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            if self.readonly:
+                conn = sqlite3.connect(f'{self.path.as_uri()}?mode=ro', uri=True)
+            else:
+                conn = sqlite3.connect(self.path)
+                if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_FORMAT:
+                    conn.executescript(DROP_TABLES)
+                    conn.execute(f"PRAGMA user_version = {STORE_FORMAT}")
+                conn.executescript(SCHEMA)
+            conn = self.local.conn = conn
+        return conn
+
+    def put_version(self, version, data, artifact, source):
+        """Replace version with the protocols in data (parsed JSON) and their
+        build artifact (see build_artifacts.py)."""
+        blocks, xrefs, related, doses = artifact['blocks'], artifact['xrefs'], artifact['related'], artifact['doses']
+        with self.db as db:
+            db.execute(
+                "INSERT INTO protocol_text(protocol_text, rowid, title, content) "
+                "SELECT 'delete', rowid, title, content FROM protocols WHERE version = ?", (version,))
+            db.execute("DELETE FROM protocols WHERE version = ?", (version,))
+            db.executemany(
+                "INSERT INTO protocols VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (version, p['id'], position, p['title'], p.get('section', 'Other'), p.get('section_num', ''),
+                     json.dumps(p.get('provider_levels', [])), json.dumps(p.get('pages', [])),
+                     json.dumps(xrefs['refs'][p['id']]), json.dumps(xrefs['referenced_by'][p['id']]),
+                     json.dumps(related[p['id']]), json.dumps(doses[p['id']]),
+                     p['content'], json.dumps(blocks[p['id']], ensure_ascii=False))
+                    for position, p in enumerate(sorted(data.values(), key=protocol_order))
+                ],
+            )
+            db.execute(
+                "INSERT INTO protocol_text(rowid, title, content) "
+                "SELECT rowid, title, content FROM protocols WHERE version = ?", (version,))
+            db.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?)", (version, source, time.time()))
+
+    def versions(self):
+        """Stored versions; none when the file was written in another format."""
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != STORE_FORMAT:
+            return []
+        return [row[0] for row in self.db.execute("SELECT version FROM versions ORDER BY version")]
+
+    def source(self, version):
+        """Hash of the parsed JSON a version was imported from, or None."""
+        row = self.db.execute("SELECT source FROM versions WHERE version = ?", (version,)).fetchone()
+        return row[0] if row else None
+
+    def headers(self, version):
+        """A version's protocols in book order, without content or blocks."""
+        rows = self.db.execute(
+            f"SELECT {HEADER_COLUMNS} FROM protocols WHERE version = ? ORDER BY position", (version,))
+        return Corpus(header(row) for row in rows)
+
+    def protocol(self, version, pid):
+        """One protocol with its content and prepared blocks, or None."""
+        row = self.db.execute(
+            f"SELECT {HEADER_COLUMNS}, content, blocks FROM protocols WHERE version = ? AND id = ?",
+            (version, pid)).fetchone()
+        if row is None:
+            return None
+        return header(row[:10])._replace(content=row[10], blocks=prepare_blocks(json.loads(row[11])))
+
+    def search(self, version, query):
+        """IDs of a version's protocols containing every word of query, best
+        BM25 match first; the last word may be a prefix."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' '.join(f'"{tok}"' for tok in tokens) + '*'
+        rows = self.db.execute(
+            "SELECT p.id FROM protocol_text JOIN protocols p ON p.rowid = protocol_text.rowid "
+            "WHERE protocol_text MATCH ? AND p.version = ? "
+            "ORDER BY bm25(protocol_text, ?, ?)",
+            (match, version, FIELD_BOOSTS['title'], FIELD_BOOSTS['content']))
+        return [row[0] for row in rows]
+
+
+class ProtocolCache:
+    """Bounded LRU of stored protocols shared by every session in the process.
+
+    get() loads a miss from the store; prefetch() queues loads on a small
+    thread pool so they land in the cache while the user is still reading.
+    Entries are keyed by the source hash of their version, so a re-imported
+    version is never served stale.
+    """
+
+    def __init__(self, store, maxsize=256, workers=2):
+        self.store = store
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.hits = self.misses = self.prefetched = self.evictions = 0
+
+    def get(self, version, pid, source):
+        key = (version, source, pid)
+        with self.lock:
+            proto = self.entries.get(key)
+            if proto is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return proto
+            self.misses += 1
+        proto = self.store.protocol(version, pid)
+        if proto is not None:
+            self.put(key, proto)
+        return proto
+
+    def prefetch(self, version, pids, source):
+        for pid in pids:
+            key = (version, source, pid)
+            with self.lock:
+                if key in self.entries or key in self.pending:
+                    continue
+                self.pending.add(key)
+            self.pool.submit(self.load, key)
+
+    def load(self, key):
+        try:
+            proto = self.store.protocol(key[0], key[2])
+            if proto is not None:
+                self.put(key, proto)
+                with self.lock:
+                    self.prefetched += 1
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def put(self, key, proto):
+        with self.lock:
+            self.entries[key] = proto
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'prefetched': self.prefetched,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def main():
+    version = sys.argv[1] if len(sys.argv) > 1 else CURRENT_VERSION
+    source_path = Path(sys.argv[2]) if len(sys.argv) > 2 else SOURCE_PATH
+
+    with open(source_path) as f:
+        data = json.load(f)
+    store = ProtocolStore()
+    store.put_version(version, data, load_build(source_path), source_hash(source_path))
+    print(f"Stored {len(data)} protocols as version {version}")
+    print(f"Versions in {STORE_PATH.name}: {', '.join(store.versions())} "
+          f"({STORE_PATH.stat().st_size / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,521 @@
+"""Inverted index and BM25 ranking for the protocol search box."""
+
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Words, doses and protocol IDs ("3.5a", "0.1", "mg") all survive as tokens.
+# Matching is case-insensitive on the original text so offsets line up.
+TOKEN_RE = re.compile(r'[a-z0-9]+(?:\.[a-z0-9]+)*', re.I | re.A)
+
+# BM25 parameters and per-field score boosts
+K1 = 1.2
+B = 0.75
+FIELD_BOOSTS = {'title': 3.0, 'content': 1.0}
+
+# ID matches always outrank text matches
+ID_EXACT_BOOST = 1000.0
+ID_PREFIX_BOOST = 100.0
+
+# Cap on vocabulary terms a partial word may expand to
+MAX_PREFIX_EXPANSIONS = 50
+PREFIX_WEIGHT = 0.8
+
+# Typo tolerance: shortest term to correct and the score weight of a
+# corrected match. Fuzzy-only hits always rank below exact/prefix hits.
+MIN_FUZZY_LEN = 4
+FUZZY_WEIGHT = 0.5
+
+# Keyword-in-context window around the first hit, in characters
+SNIPPET_BEFORE = 60
+SNIPPET_AFTER = 140
+
+# Protocols an abbreviation names outright ("stemi" -> 3.1) rank just
+# below ID matches
+SYNONYM_PROTOCOL_BOOST = 50.0
+
+
+def tokenize(text):
+    """Lowercase and split text into index tokens."""
+    return [tok.lower() for tok in TOKEN_RE.findall(text)]
+
+
+def iter_tokens(text):
+    """Yield (token, char offset) pairs for text."""
+    for m in TOKEN_RE.finditer(text):
+        yield m.group().lower(), m.start()
+
+
+def normalize_query(query):
+    """Canonical form of a query: queries that tokenize alike rank alike."""
+    return ' '.join(tokenize(query))
+
+
+def trigrams(token):
+    """Character trigrams of a token, padded so word boundaries count."""
+    padded = f'${token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term):
+    """Edit distance allowed when correcting a term of this length."""
+    return 1 if len(term) <= 6 else 2
+
+
+def bounded_edit_distance(a, b, limit):
+    """Edit distance between a and b counting adjacent swaps as one edit.
+
+    Gives up early and returns limit + 1 once the distance must exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, prev2[j - 2] + 1)
+            cur.append(d)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return min(prev[-1], limit + 1)
+
+
+class SearchIndex:
+    """BM25 index over protocol ID, title and content, built once at load.
+
+    synonyms is an optional SynonymExpander applied to every query.
+    """
+
+    def __init__(self, protocols, synonyms=None):
+        self.synonyms = synonyms
+        self.ids = [p.id for p in protocols]
+        self.id_lower = [pid.lower() for pid in self.ids]
+        self.id_to_doc = {pid: i for i, pid in enumerate(self.id_lower)}
+        self.sorted_ids = sorted(self.id_to_doc)
+
+        self.contents = [p.content for p in protocols]
+
+        # Raw term frequencies and field lengths per document, plus content
+        # token offsets (token -> doc -> [char offset]) for snippets
+        field_tfs = {f: [] for f in FIELD_BOOSTS}
+        field_lens = {f: [] for f in FIELD_BOOSTS}
+        self.positions = {}
+        for doc, p in enumerate(protocols):
+            for field in FIELD_BOOSTS:
+                tf = {}
+                length = 0
+                for tok, offset in iter_tokens(getattr(p, field)):
+                    tf[tok] = tf.get(tok, 0) + 1
+                    length += 1
+                    if field == 'content':
+                        self.positions.setdefault(tok, {}).setdefault(doc, []).append(offset)
+                field_tfs[field].append(tf)
+                field_lens[field].append(length)
+
+        n_docs = len(protocols)
+
+        # BM25 per field, summed with field boosts; idf and length
+        # normalization are folded in now so a query is lookups and sums
+        self.postings = {}
+        for field, boost in FIELD_BOOSTS.items():
+            lens = field_lens[field]
+            avg_len = (sum(lens) / n_docs if n_docs else 0) or 1
+            for doc, tf in enumerate(field_tfs[field]):
+                norm = K1 * (1 - B + B * lens[doc] / avg_len)
+                for tok, count in tf.items():
+                    postings = self.postings.setdefault(tok, {})
+                    postings[doc] = postings.get(doc, 0.0) + boost * count * (K1 + 1) / (count + norm)
+        for tok, postings in self.postings.items():
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc in postings:
+                postings[doc] *= idf
+
+        self.vocab = sorted(self.postings)
+
+        # Trigram -> vocabulary tokens, for typo candidates. Tokens with
+        # digits (IDs, doses) are left out: 3.4A must never "correct" to 3.5A.
+        self.trigram_index = {}
+        for tok in self.vocab:
+            if len(tok) >= MIN_FUZZY_LEN - 1 and tok.isalpha():
+                for gram in trigrams(tok):
+                    self.trigram_index.setdefault(gram, []).append(tok)
+
+    def prefix_range(self, term):
+        """Slice bounds of the vocabulary tokens starting with term."""
+        lo = bisect_left(self.vocab, term)
+        return lo, bisect_left(self.vocab, term + '\x7f', lo)
+
+    def expand_term(self, term, prefix=True):
+        """Return (token, weight) pairs a query term matches in the vocabulary."""
+        expansions = []
+        if term in self.postings:
+            expansions.append((term, 1.0))
+        if not prefix:
+            return expansions
+        lo, hi = self.prefix_range(term)
+        completions = [tok for tok in self.vocab[lo:hi] if tok != term]
+        if len(completions) > MAX_PREFIX_EXPANSIONS:
+            completions = heapq.nlargest(
+                MAX_PREFIX_EXPANSIONS, completions, key=lambda tok: len(self.postings[tok])
+            )
+        expansions.extend((tok, PREFIX_WEIGHT) for tok in completions)
+        return expansions
+
+    def fuzzy_matches(self, term):
+        """Closest vocabulary tokens within a small edit distance of a term.
+
+        Candidates must share enough trigrams with the term that they could
+        be within the edit budget (one edit touches at most three trigrams);
+        only those are verified with a bounded edit-distance check.
+        """
+        if len(term) < MIN_FUZZY_LEN or not term.isalpha():
+            return []
+        limit = max_edits(term)
+        grams = trigrams(term)
+        needed = len(grams) - 3 * limit
+        shared = {}
+        for gram in grams:
+            for tok in self.trigram_index.get(gram, ()):
+                shared[tok] = shared.get(tok, 0) + 1
+
+        best, matches = limit + 1, []
+        for tok, count in shared.items():
+            if count < needed:
+                continue
+            dist = bounded_edit_distance(term, tok, min(limit, best))
+            if dist < best:
+                best, matches = dist, [tok]
+            elif dist == best and dist <= limit:
+                matches.append(tok)
+        return matches
+
+    def term_tokens(self, term, prefix=True, typos=True):
+        """Vocabulary tokens a query term resolves to, as {token: weight}.
+
+        Returns (exact, corrected): exact and prefix matches, then tokens
+        reached through a typo correction, which is only attempted when
+        the term matches nothing as typed.
+        """
+        exact = dict(self.expand_term(term, prefix))
+        corrected = {}
+        if typos and not exact:
+            # A corrected word also picks up its own completions
+            # ("siezure" -> seizure -> seizures)
+            for match in self.fuzzy_matches(term):
+                for tok, weight in self.expand_term(match):
+                    corrected[tok] = max(weight * FUZZY_WEIGHT, corrected.get(tok, 0.0))
+        return exact, corrected
+
+    def score_term(self, term, prefix=True, typos=True, candidates=None):
+        """Score per document for one query term, including ID boosts.
+
+        Returns (scores, fuzzy) where fuzzy holds the documents that matched
+        only through a typo correction. With candidates, only those
+        documents are scored and the cost follows their number rather
+        than the length of the postings lists.
+        """
+        exact, corrected = self.term_tokens(term, prefix, typos)
+        scores = {}
+        for tok, weight in exact.items():
+            for doc, s in self._postings_items(tok, candidates):
+                s *= weight
+                if s > scores.get(doc, 0.0):
+                    scores[doc] = s
+
+        fuzzy = set()
+        for tok, weight in corrected.items():
+            for doc, s in self._postings_items(tok, candidates):
+                if doc in scores and doc not in fuzzy:
+                    continue
+                s *= weight
+                if s > scores.get(doc, 0.0):
+                    scores[doc] = s
+                    fuzzy.add(doc)
+
+        lo = bisect_left(self.sorted_ids, term)
+        hi = bisect_left(self.sorted_ids, term + '\x7f', lo)
+        for pid in self.sorted_ids[lo:hi]:
+            doc = self.id_to_doc[pid]
+            if candidates is not None and doc not in candidates:
+                continue
+            boost = ID_EXACT_BOOST if pid == term else ID_PREFIX_BOOST
+            scores[doc] = scores.get(doc, 0.0) + boost
+            fuzzy.discard(doc)
+        return scores, fuzzy
+
+    def _postings_items(self, tok, candidates):
+        postings = self.postings[tok]
+        if candidates is None:
+            return postings.items()
+        if len(candidates) < len(postings):
+            return [(doc, postings[doc]) for doc in candidates if doc in postings]
+        return [(doc, s) for doc, s in postings.items() if doc in candidates]
+
+    def score_phrase(self, tokens, prefix=True, typos=True, candidates=None):
+        """Scores for documents matching every token of a phrase."""
+        totals, fuzzy = None, set()
+        for tok in tokens:
+            scores, tok_fuzzy = self.score_term(tok, prefix, typos, candidates)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {doc: s + scores[doc] for doc, s in totals.items() if doc in scores}
+            if not totals:
+                return {}, set()
+            fuzzy |= tok_fuzzy
+        return totals, fuzzy & totals.keys()
+
+    def score_group(self, phrase, expansions, protocols, candidates=None):
+        """Scores for one query group: the typed phrase or any of its synonyms."""
+        if not expansions and not protocols:
+            return self.score_phrase(phrase, candidates=candidates)
+
+        # A recognized abbreviation is matched as typed ("mi" is not a
+        # prefix search); its expansions still pick up inflections
+        scores, _ = self.score_phrase(phrase, prefix=False, typos=False, candidates=candidates)
+        for alt in expansions:
+            alt_scores, _ = self.score_phrase(alt, typos=False, candidates=candidates)
+            for doc, s in alt_scores.items():
+                if s > scores.get(doc, 0.0):
+                    scores[doc] = s
+        for pid in protocols:
+            doc = self.id_to_doc.get(pid.lower())
+            if doc is not None and (candidates is None or doc in candidates):
+                scores[doc] = scores.get(doc, 0.0) + SYNONYM_PROTOCOL_BOOST
+        return scores, set()
+
+    def query_groups(self, query):
+        """Tokenize a query and apply synonym expansion."""
+        terms = tokenize(query)
+        if self.synonyms:
+            return self.synonyms.expand(terms)
+        return [((term,), (), ()) for term in terms]
+
+    def rank(self, query, candidates=None):
+        """Ranked document numbers matching every term of the query.
+
+        candidates optionally restricts scoring to a set of document numbers.
+        """
+        groups = self.query_groups(query)
+        if not groups:
+            return []
+
+        totals = None
+        fuzzy = set()
+        for group in groups:
+            scores, group_fuzzy = self.score_group(*group, candidates=candidates)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {doc: s + scores[doc] for doc, s in totals.items() if doc in scores}
+            if not totals:
+                return []
+            fuzzy |= group_fuzzy
+
+        # Exact and prefix hits first, typo-corrected hits after
+        ranked = sorted(totals.items(), key=lambda x: (x[0] in fuzzy, -x[1], x[0]))
+        return [doc for doc, _ in ranked]
+
+    def search(self, query, allowed=None):
+        """Rank protocol IDs matching every term of the query.
+
+        allowed is an optional set of protocol IDs to restrict results to.
+        """
+        ids = [self.ids[doc] for doc in self.rank(query)]
+        if allowed is not None:
+            ids = [pid for pid in ids if pid in allowed]
+        return ids
+
+    def narrows(self, query):
+        """True when every extension of query can only match a subset of its hits.
+
+        That holds while matching is plain exact/prefix lookup: no synonym
+        expansion, no typo correction and no capped prefix list. A query
+        with no terms matches nothing, so it narrows nothing.
+        """
+        groups = self.query_groups(query)
+        if not groups:
+            return False
+        for phrase, expansions, protocols in groups:
+            if expansions or protocols:
+                return False
+            term = phrase[0]
+            lo, hi = self.prefix_range(term)
+            if hi - lo > MAX_PREFIX_EXPANSIONS:
+                return False
+            if lo == hi and len(term) >= MIN_FUZZY_LEN and term.isalpha():
+                return False
+        return True
+
+    # ---------- Hit positions ----------
+    def query_tokens(self, query):
+        """Every vocabulary token a query resolves to, for highlighting."""
+        tokens = set()
+        for phrase, expansions, _ in self.query_groups(query):
+            for tok in phrase:
+                exact, corrected = self.term_tokens(tok, prefix=not expansions, typos=not expansions)
+                tokens.update(exact, corrected)
+            for alt in expansions:
+                for tok in alt:
+                    exact, _ = self.term_tokens(tok, typos=False)
+                    tokens.update(exact)
+        return tokens
+
+    def hit_spans(self, pid, tokens):
+        """Sorted (start, end) content offsets of the given tokens in one protocol."""
+        doc = self.id_to_doc.get(pid.lower())
+        if doc is None:
+            return []
+        spans = []
+        for tok in tokens:
+            for offset in self.positions.get(tok, {}).get(doc, ()):
+                spans.append((offset, offset + len(tok)))
+        spans.sort()
+        return spans
+
+    def phrase_ids(self, phrase):
+        """Protocol IDs whose content contains the words of phrase in sequence."""
+        tokens = tokenize(phrase)
+        if not tokens or tokens[0] not in self.positions:
+            return []
+        docs = []
+        for doc, offsets in self.positions[tokens[0]].items():
+            ends = {o + len(tokens[0]) for o in offsets}
+            for tok in tokens[1:]:
+                following = self.positions.get(tok, {}).get(doc, ())
+                # Next word must start just after the previous one ("calcium chloride",
+                # "piperacillin-tazobactam")
+                ends = {o + len(tok) for o in following if any(o - e in (1, 2) for e in ends)}
+                if not ends:
+                    break
+            if ends:
+                docs.append(doc)
+        return [self.ids[doc] for doc in sorted(docs)]
+
+    def snippet(self, pid, tokens):
+        """Keyword-in-context excerpt around the first content hit.
+
+        Returns (text, spans) with spans relative to text, or None when the
+        tokens only occur in the ID or title.
+        """
+        spans = self.hit_spans(pid, tokens)
+        if not spans:
+            return None
+        content = self.contents[self.id_to_doc[pid.lower()]]
+        first = spans[0][0]
+        start = max(0, first - SNIPPET_BEFORE)
+        end = min(len(content), first + SNIPPET_AFTER)
+        # Snap to word boundaries so the excerpt does not open mid-word
+        if start > 0:
+            space = content.find(' ', start, first)
+            start = space + 1 if space != -1 else start
+        if end < len(content):
+            space = content.rfind(' ', first, end)
+            end = space if space > first else end
+
+        text = content[start:end].replace('\n', ' ')
+        prefix = '… ' if start > 0 else ''
+        suffix = ' …' if end < len(content) else ''
+        shift = len(prefix) - start
+        rel = [(s + shift, e + shift) for s, e in spans if s >= start and e <= end]
+        return prefix + text + suffix, rel
+
+
+class SearchSession:
+    """Per-session search-as-you-type state.
+
+    Keeps the hits of the previous query; when the next query extends it
+    (the user typed another character), only those hits are re-scored.
+    Deletions, edits and queries that use synonyms or typo correction
+    fall back to a full search.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.tokens = []
+        self.candidates = None
+        # Whether the last search was ranked within the previous hits only
+        self.narrowed = False
+
+    def extends(self, tokens):
+        """True when tokens continue the previous query's: the same words,
+        the last one possibly longer, then possibly more words."""
+        old = self.tokens
+        if not old or len(tokens) < len(old):
+            return False
+        return tokens[:len(old) - 1] == old[:-1] and tokens[len(old) - 1].startswith(old[-1])
+
+    def search(self, query, allowed=None):
+        index = self.index
+        tokens = tokenize(query)
+        candidates = None
+        if self.candidates is not None and self.extends(tokens) and index.narrows(query):
+            candidates = self.candidates
+        docs = index.rank(query, candidates)
+
+        self.narrowed = candidates is not None
+        self.tokens = tokens
+        self.candidates = set(docs) if index.narrows(query) else None
+
+        ids = [index.ids[doc] for doc in docs]
+        if allowed is not None:
+            ids = [pid for pid in ids if pid in allowed]
+        return ids
+
+
+class QueryCache:
+    """Bounded LRU of ranked results shared by every session in the process.
+
+    Entries belong to one data version; the first lookup under a new
+    version drops them all.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, version):
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+            ids = self.entries.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put(self, key, ids, version):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = tuple(ids)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
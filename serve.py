@@ -0,0 +1,27 @@
+"""Serve app.py with its data loaded at server boot.
+
+Plain `streamlit run app.py` loads the snapshot when the first session
+starts, so the first visitor after a restart waits for it. Serving through
+this file loads it (and imports everything app.py needs) before the server
+accepts connections.
+
+Usage: streamlit run serve.py
+"""
+
+from contextlib import asynccontextmanager
+
+import streamlit as st
+
+from perf import timer
+from snapshot import load_snapshot
+
+
+@asynccontextmanager
+async def warmup(app):
+    with timer('load.warmup'):
+        snap = load_snapshot()
+    print(f"Warmed up: {len(snap.corpus)} protocols loaded")
+    yield
+
+
+app = st.App("app.py", lifespan=warmup)
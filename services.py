@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Per-service overlays for Section 6, Medical Director Options.
+
+Each ambulance service adopts its own set of 6.x options and may add local
+text to any protocol. services.json, written by each deployment, lists
+them:
+
+    {"slug": {"name": "...", "options": ["6.1", "6.6"], "addenda": {"6.6": "..."}}}
+
+None ship with the code: without services.json the app shows the
+statewide protocols only. tests/services_example.json is an example.
+
+A ServiceView lays one service over a shared snapshot, copy-on-write: it
+keeps a visibility mask over the snapshot's facet bits and the few
+protocols its addenda change, and reads every other protocol and index from
+the snapshot. A service costs its addenda, not a copy of the corpus.
+
+Run to check services.json against the data:
+
+Usage: python services.py
+"""
+
+import json
+import pickle
+from collections import namedtuple
+from pathlib import Path
+
+from autocomplete import KIND_MED
+from blocks import build_blocks, prepare_blocks
+from search_index import tokenize
+from snapshot import load_snapshot
+
+SERVICES_PATH = Path(__file__).parent / "services.json"
+
+# The section services opt into, and its protocols every service keeps
+OPTIONS_SECTION = '6'
+REQUIRED_OPTIONS = ('6.0',)
+
+Service = namedtuple('Service', 'slug name options addenda')
+
+
+def load_services(path=SERVICES_PATH):
+    """{slug: Service}, empty when there is no services.json."""
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {
+        slug: Service(slug, entry.get('name', slug), frozenset(entry.get('options', [])), entry.get('addenda', {}))
+        for slug, entry in entries.items()
+    }
+
+
+def is_option(proto):
+    return proto.section_num == OPTIONS_SECTION and proto.id not in REQUIRED_OPTIONS
+
+
+def with_addendum(proto, service, text):
+    """proto with the service's addendum appended to its content and blocks."""
+    heading = f"{service.name.upper()} ADDENDUM"
+    addendum = f"{heading}\n{text}"
+    offset = len(proto.content) + 2 if proto.content else 0
+    blocks = build_blocks(addendum)
+    for block in blocks:
+        block['offset'] += offset
+    return proto._replace(content=f"{proto.content}\n\n{addendum}" if proto.content else addendum,
+                          blocks=proto.blocks + prepare_blocks(blocks))
+
+
+class ServiceView:
+    """One service's view of a snapshot.
+
+    visible masks out the 6.x options the service has not adopted; AND it
+    into any facet mask. protocol() returns the shared protocol unless the
+    service has an addendum for it.
+    """
+
+    def __init__(self, snapshot, service):
+        self.snapshot = snapshot
+        self.service = service
+        facets = snapshot.facets
+        hidden = [p.id for p in snapshot.corpus.protocols if is_option(p) and p.id not in service.options]
+        self.visible = facets.all & ~facets.mask_of(hidden)
+        self.addenda = {pid: text for pid, text in service.addenda.items() if self.shows(pid)}
+        self.addendum_tokens = {pid: set(tokenize(text)) for pid, text in self.addenda.items()}
+        self.overrides = {}
+
+    def shows(self, pid):
+        return bool(self.visible & self.snapshot.facets.bit.get(pid, 0))
+
+    def protocol(self, proto):
+        """The service's copy of a full protocol (the shared one when
+        unchanged), or None when the service hides it. Copies are made on
+        first use."""
+        if proto is None or not self.shows(proto.id):
+            return None
+        if proto.id not in self.addenda:
+            return proto
+        copy = self.overrides.get(proto.id)
+        if copy is None:
+            copy = self.overrides[proto.id] = with_addendum(proto, self.service, self.addenda[proto.id])
+        return copy
+
+    def completions(self, items):
+        """Quick-jump completion items without the protocols the service
+        hides; an item left with none is dropped."""
+        kept = []
+        for kind, name, label, ids in items:
+            shown = tuple(pid for pid in ids if self.shows(pid))
+            if not shown:
+                continue
+            if kind == KIND_MED and len(shown) != len(ids):
+                label = f"{name} · {len(shown)} protocol{'s' if len(shown) != 1 else ''}"
+            kept.append((kind, name, label, shown))
+        return kept
+
+    def search_addenda(self, query):
+        """IDs whose addendum contains every word of query; the last word may
+        be a prefix."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        *words, last = tokens
+        return [pid for pid, vocab in self.addendum_tokens.items()
+                if all(word in vocab for word in words) and any(tok.startswith(last) for tok in vocab)]
+
+
+def main():
+    snap = load_snapshot()
+    services = load_services()
+    options = [p.id for p in snap.corpus.protocols if is_option(p)]
+    print(f"{len(services)} services over {len(options)} Medical Director Options")
+    for service in services.values():
+        unknown = sorted((service.options | set(service.addenda)) - set(snap.corpus.by_id))
+        view = ServiceView(snap, service)
+        # What the view adds over the snapshot: its mask, addenda and their blocks
+        added = [view.protocol(snap.corpus.by_id[pid]).blocks[len(snap.corpus.by_id[pid].blocks):]
+                 for pid in view.addenda]
+        size = len(pickle.dumps((view.visible, view.addenda, view.addendum_tokens, added)))
+        print(f"  {service.slug:16} {service.name}: {len(service.options & set(options))}/{len(options)} options, "
+              f"{len(view.addenda)} addenda, ~{size / 1024:.1f} KB")
+        if unknown:
+            print(f"    Unknown protocols: {', '.join(unknown)}")
+
+
+if __name__ == '__main__':
+    main()
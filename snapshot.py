@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Startup snapshot of the corpus and every index the app builds from it.
+
+Run after build_artifacts.py. Writes protocols_snapshot.pickle: protocols in
+book order with their prepared blocks, the search index, quick-jump
+completions, medication mentions, facets, doses and pediatric dosing
+tables, stamped with a hash of the parsed data and of every file they are
+built from. Loading it replaces
+parsing, sorting and index builds at startup; a missing or stale snapshot is
+rebuilt in memory instead.
+
+A running app reloads the snapshot by itself when any of those files
+change, without a restart (see LiveSnapshot).
+
+It is a pickle, so only load snapshots this script wrote.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from autocomplete import build_completions
+from build_artifacts import SOURCE_PATH
+from corpus import load_corpus
+from dosing import dosing_tables
+from facets import FacetIndex
+from medications import dose_index, load_medications, medication_mentions
+from perf import timer
+from search_index import SearchIndex
+from synonyms import load_synonyms
+
+HERE = Path(__file__).parent
+SNAPSHOT_PATH = HERE / "protocols_snapshot.pickle"
+
+# Bump when the snapshot layout changes
+SNAPSHOT_FORMAT = 3
+
+# Code and data the snapshot is built from; editing any of them makes it stale
+INPUTS = [
+    'autocomplete.py', 'blocks.py', 'build_artifacts.py', 'corpus.py', 'dosing.py', 'facets.py',
+    'medications.py', 'medications.json', 'search_index.py', 'snapshot.py',
+    'synonyms.py', 'synonyms.json',
+]
+
+Snapshot = namedtuple('Snapshot', 'stamp corpus search_index completions med_mentions med_names facets doses dosing')
+
+# Seconds between checks of the input files for changes
+RELOAD_INTERVAL = 2.0
+
+# Live snapshots in this process, by source path
+_live = {}
+_lock = threading.Lock()
+
+
+def snapshot_stamp(source_path=SOURCE_PATH):
+    digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+    for path in [Path(source_path)] + [HERE / name for name in INPUTS]:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def build_snapshot(source_path=SOURCE_PATH, stamp=None):
+    return index_corpus(load_corpus(source_path), stamp or snapshot_stamp(source_path))
+
+
+def index_corpus(corpus, stamp):
+    """Snapshot of an already loaded corpus."""
+    with timer('load.search_index'):
+        search_index = SearchIndex(corpus.protocols, synonyms=load_synonyms())
+    with timer('load.completions'):
+        med_mentions = medication_mentions(search_index, load_medications())
+        med_names = {name.lower(): name for name in med_mentions}
+        completions = build_completions(corpus.protocols, med_mentions)
+    with timer('load.facets'):
+        facets = FacetIndex(corpus.protocols, med_mentions)
+    return Snapshot(
+        stamp=stamp,
+        corpus=corpus,
+        search_index=search_index,
+        completions=completions,
+        med_mentions=med_mentions,
+        med_names=med_names,
+        facets=facets,
+        doses=dose_index(corpus.protocols),
+        dosing=dosing_tables(corpus.protocols),
+    )
+
+
+def read_snapshot(snapshot_path, stamp):
+    """The snapshot at snapshot_path if it was built with this stamp, else None."""
+    try:
+        with timer('load.unpickle'), open(snapshot_path, 'rb') as f:
+            snap = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    return snap if isinstance(snap, Snapshot) and snap.stamp == stamp else None
+
+
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class LiveSnapshot:
+    """The current snapshot for one source file, reloaded without a restart.
+
+    get() stats the input files at most every RELOAD_INTERVAL seconds. When
+    they change, a background thread hashes them and loads or builds the new
+    snapshot, then swaps it in with one assignment: readers keep getting the
+    old snapshot until the new one is complete, and never wait for it. A
+    failed load (a file caught half-written, say) keeps the old snapshot
+    until the files change again.
+    """
+
+    def __init__(self, source_path=SOURCE_PATH, snapshot_path=SNAPSHOT_PATH, interval=RELOAD_INTERVAL):
+        self.source_path = Path(source_path)
+        self.snapshot_path = Path(snapshot_path)
+        self.interval = interval
+        self.paths = [self.source_path, self.snapshot_path] + [HERE / name for name in INPUTS]
+        self.lock = threading.Lock()
+        self.reloading = False
+        self.checked = time.monotonic()
+        self.signature = file_signature(self.paths)
+        self.current = self.load(snapshot_stamp(self.source_path))
+
+    def load(self, stamp):
+        return read_snapshot(self.snapshot_path, stamp) or build_snapshot(self.source_path, stamp)
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked >= self.interval:
+            self.check(now)
+        return self.current
+
+    def check(self, now):
+        with self.lock:
+            if self.reloading or now - self.checked < self.interval:
+                return
+            self.checked = now
+            signature = file_signature(self.paths)
+            if signature == self.signature:
+                return
+            self.reloading = True
+        threading.Thread(target=self.reload, args=(signature,), daemon=True).start()
+
+    def reload(self, signature):
+        try:
+            with timer('load.reload'):
+                stamp = snapshot_stamp(self.source_path)
+                if stamp != self.current.stamp:
+                    self.current = self.load(stamp)
+        except Exception as e:
+            print(f"Reloading {self.source_path.name} failed, still serving the previous data: {e}")
+        finally:
+            self.signature = signature
+            self.reloading = False
+
+
+def load_snapshot(source_path=SOURCE_PATH, snapshot_path=SNAPSHOT_PATH):
+    """The current snapshot for source_path. The first call in a process
+    loads it; later calls return whatever the live reloader last swapped in."""
+    key = Path(source_path).resolve()
+    live = _live.get(key)
+    if live is None:
+        with _lock:
+            live = _live.get(key)
+            if live is None:
+                live = _live[key] = LiveSnapshot(source_path, snapshot_path)
+    return live.get()
+
+
+def main():
+    snap = build_snapshot()
+    # Written aside and renamed so a running app never reads a partial file
+    tmp_path = SNAPSHOT_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, SNAPSHOT_PATH)
+
+    print(f"Snapshot of {len(snap.corpus)} protocols, {len(snap.search_index.vocab)} terms, "
+          f"{len(snap.med_mentions)} medications ({SNAPSHOT_PATH.stat().st_size / 1024:.0f} KB)")
+    print(f"Saved to {SNAPSHOT_PATH}")
+
+
+if __name__ == '__main__':
+    # Pickle from the imported module so Snapshot resolves as snapshot.Snapshot
+    import snapshot
+    snapshot.main()
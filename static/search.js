@@ -0,0 +1,232 @@
+// Client-side protocol search for the static export (export_static.py).
+//
+// Loads search.json once and ranks like SearchIndex.rank in search_index.py:
+// every query group must match, partial words expand over the sorted
+// vocabulary, protocol IDs and synonym protocols get fixed boosts. Typo
+// correction is left to the server app.
+(function () {
+  'use strict';
+
+  var TOKEN_RE = /[a-z0-9]+(?:\.[a-z0-9]+)*/g;
+
+  var index = null;
+  var decoded = {};
+  var sortedIds = [];
+  var idToDoc = {};
+  var maxPhrase = 1;
+  var level = '';
+
+  function tokenize(text) {
+    return text.toLowerCase().match(TOKEN_RE) || [];
+  }
+
+  function lowerBound(arr, x) {
+    var lo = 0, hi = arr.length;
+    while (lo < hi) {
+      var mid = (lo + hi) >> 1;
+      if (arr[mid] < x) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+  }
+
+  function prefixRange(arr, term) {
+    var lo = lowerBound(arr, term);
+    return [lo, lowerBound(arr, term + '\x7f')];
+  }
+
+  // Postings of vocabulary token i as {doc: score}, decoded on first use
+  function postings(i) {
+    var p = decoded[i];
+    if (!p) {
+      var flat = index.postings[i], doc = 0, scale = index.params.scoreScale;
+      p = {};
+      for (var j = 0; j < flat.length; j += 2) {
+        doc += flat[j];
+        p[doc] = flat[j + 1] / scale;
+      }
+      decoded[i] = p;
+    }
+    return p;
+  }
+
+  // [token number, weight] pairs a query term matches
+  function expandTerm(term, prefix) {
+    var terms = index.terms, params = index.params;
+    var range = prefixRange(terms, term);
+    var out = [];
+    if (range[0] < terms.length && terms[range[0]] === term) out.push([range[0], 1.0]);
+    if (!prefix) return out;
+    var completions = [];
+    for (var i = range[0]; i < range[1]; i++) {
+      if (terms[i] !== term) completions.push(i);
+    }
+    if (completions.length > params.maxPrefixExpansions) {
+      completions.sort(function (a, b) { return index.postings[b].length - index.postings[a].length; });
+      completions = completions.slice(0, params.maxPrefixExpansions);
+    }
+    completions.forEach(function (i) { out.push([i, params.prefixWeight]); });
+    return out;
+  }
+
+  function scoreTerm(term, prefix) {
+    var scores = {};
+    expandTerm(term, prefix).forEach(function (pair) {
+      var p = postings(pair[0]);
+      for (var doc in p) {
+        var s = p[doc] * pair[1];
+        if (!(scores[doc] >= s)) scores[doc] = s;
+      }
+    });
+    var range = prefixRange(sortedIds, term);
+    for (var i = range[0]; i < range[1]; i++) {
+      var doc = idToDoc[sortedIds[i]];
+      var boost = sortedIds[i] === term ? index.params.idExactBoost : index.params.idPrefixBoost;
+      scores[doc] = (scores[doc] || 0) + boost;
+    }
+    return scores;
+  }
+
+  // Documents matching every token of a phrase, scores summed
+  function scorePhrase(tokens, prefix) {
+    var totals = null;
+    for (var i = 0; i < tokens.length; i++) {
+      totals = intersect(totals, scoreTerm(tokens[i], prefix));
+      if (isEmpty(totals)) return {};
+    }
+    return totals || {};
+  }
+
+  function scoreGroup(group) {
+    if (!group.synonym) return scorePhrase(group.phrase, true);
+    var scores = scorePhrase(group.phrase, false);
+    group.synonym[0].forEach(function (alt) {
+      var altScores = scorePhrase(alt.split(' '), true);
+      for (var doc in altScores) {
+        if (!(scores[doc] >= altScores[doc])) scores[doc] = altScores[doc];
+      }
+    });
+    group.synonym[1].forEach(function (pid) {
+      var doc = idToDoc[pid.toLowerCase()];
+      if (doc !== undefined) scores[doc] = (scores[doc] || 0) + index.params.synonymProtocolBoost;
+    });
+    return scores;
+  }
+
+  // Split tokens into groups, longest synonym phrase first
+  function queryGroups(terms) {
+    var groups = [], i = 0;
+    while (i < terms.length) {
+      var matched = false;
+      for (var j = Math.min(terms.length, i + maxPhrase); j > i; j--) {
+        var synonym = index.synonyms[terms.slice(i, j).join(' ')];
+        if (synonym) {
+          groups.push({phrase: terms.slice(i, j), synonym: synonym});
+          i = j;
+          matched = true;
+          break;
+        }
+      }
+      if (!matched) {
+        groups.push({phrase: [terms[i]], synonym: null});
+        i++;
+      }
+    }
+    return groups;
+  }
+
+  function intersect(totals, scores) {
+    if (totals === null) return scores;
+    var out = {};
+    for (var doc in totals) {
+      if (doc in scores) out[doc] = totals[doc] + scores[doc];
+    }
+    return out;
+  }
+
+  function isEmpty(obj) {
+    for (var key in obj) return false;
+    return true;
+  }
+
+  function rank(query) {
+    var groups = queryGroups(tokenize(query));
+    if (!groups.length) return [];
+    var totals = null;
+    for (var i = 0; i < groups.length; i++) {
+      totals = intersect(totals, scoreGroup(groups[i]));
+      if (isEmpty(totals)) return [];
+    }
+    return Object.keys(totals).map(Number).sort(function (a, b) {
+      return totals[b] - totals[a] || a - b;
+    });
+  }
+
+  // ---------- Page ----------
+  var input = document.getElementById('search');
+  var list = document.getElementById('list');
+  var results = document.getElementById('results');
+  var none = document.getElementById('none');
+  var count = document.getElementById('count');
+  var cards = list.querySelectorAll('.proto-card');
+
+  function href(pid) {
+    return 'p/' + pid + (level ? '.' + level : '') + '.html';
+  }
+
+  function visible(doc) {
+    return !level || (index.docs[doc][2] & index.params.levelBits[level]);
+  }
+
+  function update() {
+    var query = input.value.trim();
+    if (!index || !query) {
+      // Browse mode: the pre-rendered list, filtered by level
+      results.hidden = true;
+      count.textContent = '';
+      list.hidden = false;
+      var shown = 0;
+      for (var i = 0; i < cards.length; i++) {
+        var ok = !index || visible(i);
+        cards[i].hidden = !ok;
+        cards[i].href = href(cards[i].dataset.id);
+        shown += ok ? 1 : 0;
+      }
+      none.hidden = shown > 0;
+      return;
+    }
+    var docs = rank(query).filter(visible);
+    list.hidden = true;
+    results.innerHTML = '';
+    docs.forEach(function (doc) {
+      var card = cards[doc].cloneNode(true);
+      card.hidden = false;
+      card.href = href(index.docs[doc][0]);
+      results.appendChild(card);
+    });
+    results.hidden = !docs.length;
+    none.hidden = docs.length > 0;
+    count.textContent = docs.length + ' result' + (docs.length === 1 ? '' : 's');
+  }
+
+  document.getElementById('levels').addEventListener('click', function (e) {
+    var pill = e.target.closest('.level-pill');
+    if (!pill) return;
+    e.preventDefault();
+    level = pill.dataset.level;
+    this.querySelectorAll('.level-pill').forEach(function (p) {
+      p.classList.toggle('active', p === pill);
+    });
+    update();
+  });
+  input.addEventListener('input', update);
+
+  fetch('search.json').then(function (r) { return r.json(); }).then(function (data) {
+    index = data;
+    data.docs.forEach(function (d, doc) { idToDoc[d[0].toLowerCase()] = doc; });
+    sortedIds = Object.keys(idToDoc).sort();
+    Object.keys(data.synonyms).forEach(function (phrase) {
+      maxPhrase = Math.max(maxPhrase, phrase.split(' ').length);
+    });
+    update();
+  });
+})();
@@ -0,0 +1,32 @@
+// Service worker for the static export. export_static.py fills in the cache
+// name and file list; every exported file is cached on install and served
+// from the cache first, so the book works offline after the first visit.
+var CACHE_NAME = '__CACHE_NAME__';
+var FILES = __FILES__;
+
+self.addEventListener('install', function (event) {
+  event.waitUntil(
+    caches.open(CACHE_NAME).then(function (cache) { return cache.addAll(FILES); })
+      .then(function () { return self.skipWaiting(); })
+  );
+});
+
+// Drop caches left by older exports
+self.addEventListener('activate', function (event) {
+  event.waitUntil(
+    caches.keys().then(function (names) {
+      return Promise.all(names.filter(function (name) {
+        return name !== CACHE_NAME;
+      }).map(function (name) { return caches.delete(name); }));
+    }).then(function () { return self.clients.claim(); })
+  );
+});
+
+self.addEventListener('fetch', function (event) {
+  if (event.request.method !== 'GET') return;
+  event.respondWith(
+    caches.match(event.request, {ignoreSearch: true}).then(function (hit) {
+      return hit || fetch(event.request);
+    })
+  );
+});
@@ -0,0 +1,74 @@
+"""Abbreviation and synonym expansion for search queries."""
+
+import json
+from pathlib import Path
+
+from search_index import tokenize
+
+SYNONYMS_PATH = Path(__file__).parent / "synonyms.json"
+
+# Trie key marking the end of a phrase (tokens are never empty)
+END = ''
+
+
+class SynonymExpander:
+    """Word-level trie over clinical shorthand, compiled once from synonyms.json.
+
+    Each entry maps one or more terms ("mi", "heart attack") to expansion
+    phrases and, optionally, the protocol IDs they usually mean.
+    """
+
+    def __init__(self, entries):
+        self.root = {}
+        for entry in entries:
+            expansions = [tuple(tokenize(phrase)) for phrase in entry.get('expand', [])]
+            protocols = tuple(entry.get('protocols', []))
+            for term in entry['terms']:
+                node = self.root
+                for tok in tokenize(term):
+                    node = node.setdefault(tok, {})
+                prev_expansions, prev_protocols = node.get(END, ((), ()))
+                merged = tuple(dict.fromkeys(prev_expansions + tuple(expansions)))
+                node[END] = (merged, tuple(dict.fromkeys(prev_protocols + protocols)))
+
+    def expand(self, terms):
+        """Split query tokens into groups in one left-to-right pass.
+
+        Returns a list of (phrase, expansions, protocols). At each position the
+        longest phrase in the trie wins; tokens with no entry come back as
+        single-token groups with no expansions.
+        """
+        groups = []
+        i = 0
+        while i < len(terms):
+            node = self.root
+            match, match_end = None, i
+            j = i
+            while j < len(terms) and terms[j] in node:
+                node = node[terms[j]]
+                j += 1
+                if END in node:
+                    match, match_end = node[END], j
+            if match:
+                groups.append((tuple(terms[i:match_end]), match[0], match[1]))
+                i = match_end
+            else:
+                groups.append(((terms[i],), (), ()))
+                i += 1
+        return groups
+
+    def phrases(self):
+        """Yield (phrase, expansions, protocols) for every phrase in the trie."""
+        stack = [((), self.root)]
+        while stack:
+            phrase, node = stack.pop()
+            for tok, child in node.items():
+                if tok == END:
+                    yield phrase, child[0], child[1]
+                else:
+                    stack.append((phrase + (tok,), child))
+
+
+def load_synonyms(path=SYNONYMS_PATH):
+    with open(path) as f:
+        return SynonymExpander(json.load(f))
@@ -0,0 +1,44 @@
+"""Bad requests get an error response, never a dropped connection."""
+
+import json
+import sys
+from http import HTTPStatus
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import api
+
+
+@pytest.fixture(scope='module')
+def server():
+    return api.ProtocolAPI()
+
+
+def respond(server, target):
+    status, _, body = server.respond('GET', target, {})
+    return status, json.loads(body)
+
+
+@pytest.mark.parametrize('limit', ['%C2%B2', '0', '101', '-1', 'ten'])
+def test_bad_limit_is_400(server, limit):
+    status, body = respond(server, f'/search?q=seizure&limit={limit}')
+    assert status == HTTPStatus.BAD_REQUEST
+    assert 'limit' in body['error']
+
+
+def test_limit(server):
+    status, body = respond(server, '/search?q=seizure&limit=2')
+    assert status == HTTPStatus.OK
+    assert len(body['results']) == 2
+
+
+def test_unexpected_error_is_500(server, monkeypatch):
+    def broken(payloads, target):
+        raise KeyError(target)
+    monkeypatch.setattr(api, 'route', broken)
+    status, body = respond(server, '/protocols')
+    assert status == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert body == {'error': 'Internal server error'}
@@ -0,0 +1,32 @@
+"""The app, driven through Streamlit's AppTest."""
+
+import sys
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from autocomplete import KIND_MED
+
+APP_PATH = str(Path(__file__).parent.parent / "app.py")
+
+
+@pytest.mark.parametrize('page', ['²', '0', '-3', 'x'])
+def test_bad_page_is_the_first_page(page):
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.query_params['page'] = page
+    at.run()
+    assert not at.exception
+    assert at.session_state.page == 1
+
+
+def test_quick_jump_opens_a_medications_only_protocol():
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.run()
+    at.text_input(key='search').set_value('bupren').run()
+    at.button_group(key='quick_jump').set_value(
+        (KIND_MED, 'Buprenorphine', 'Buprenorphine · 1 protocol', ('6.11',))).run()
+    assert not at.exception
+    assert dict(at.query_params)['p'] == '6.11'
@@ -0,0 +1,105 @@
+"""Dose extraction on protocol text that used to be misattributed."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from medications import extract_doses, load_medications, name_pattern
+
+NAMES = load_medications()
+NAMES_RE = name_pattern(NAMES)
+CANONICAL = {name.lower(): name for name in NAMES}
+
+
+def doses(text, pid='test'):
+    found, unparsed = extract_doses(pid, [{'text': text, 'level': None}], NAMES_RE, CANONICAL)
+    return [(d.medication, d.low, d.high, d.unit) for d in found], unparsed
+
+
+@pytest.mark.parametrize('text, medication', [
+    # 8.4: the dose is dextrose's, given after the insulin
+    ("insulin   IV/IO bolus followed by D W 0.5 g/kg   IV bolus   or 10 D W 0.5 -1 g/kg", 'Insulin'),
+    ("insulin IV/IO followed by 50 ml of", 'Insulin'),
+    # 2.3P: a fluid bolus
+    ("glucagon once if glucose level is <70 mg/dL with continued altered mental status "
+     "Known HYPERglycemia Administer 10 mL/kg fluid bolus", 'Glucagon'),
+    # 3.4A / 3.4P
+    ("oxygen Hypovolemia: 250 mL fluid bolus", 'Oxygen'),
+    ("oxygen Hypovolemia: 20 mL/kg fluid bolus", 'Oxygen'),
+    # Flushes
+    ("adenosine with a 20 mL normal saline bolus and elevate extremity.", 'Adenosine'),
+])
+def test_other_treatments_are_not_doses(text, medication):
+    found, unparsed = doses(text)
+    assert not [d for d in found if d[0] == medication]
+    assert unparsed
+
+
+@pytest.mark.parametrize('text, expected', [
+    # Diluents
+    ("Albuterol 2.5-3 mg in 3 ml normal saline, with or without",
+     [('Albuterol', 2.5, 3.0, 'mg')]),
+    ("epinephrine 11.25 mg in 2.5 mL normal saline, for suspected severe croup",
+     [('Epinephrine', 11.25, 11.25, 'mg')]),
+    # A fluid bolus after the dose
+    ("lidocaine 40 mg over two minutes, followed by a 10 mL fluid bolus over five seconds",
+     [('Lidocaine', 40.0, 40.0, 'mg')]),
+])
+def test_diluent_and_flush_volumes_are_not_doses(text, expected):
+    assert doses(text)[0] == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Midazolam 0.1 mg/kg IV/IO/IM to a maximum single dose of 8 mg.", ('Midazolam', 0.1, 0.1, 'mg/kg')),
+    ("Magnesium Sulfate 25 mg/kg IV/IO", ('Magnesium Sulfate', 25.0, 25.0, 'mg/kg')),
+    ("Glucagon ADULT: 1 – 5 mg IV/IO/IM for beta-blocker overdose", ('Glucagon', 1.0, 5.0, 'mg')),
+    ("Epinephrine infusion - 2-10 mcg/min IV/IO by infusion pump ONLY", ('Epinephrine', 2.0, 10.0, 'mcg/min')),
+])
+def test_dose_following_the_name(text, expected):
+    assert doses(text)[0][0] == expected
+
+
+def test_semicolon_ends_the_clause():
+    # 2.4, read as if risperidone were not a known name
+    text = ("If trained and authorized, under Protocol 6.9 Oral Antipsychotics administer "
+            "olanzapine 10 mg ODT; or risperidone 2 mg ODT")
+    assert doses(text)[0] == [('Olanzapine', 10.0, 10.0, 'mg'), ('Risperidone', 2.0, 2.0, 'mg')]
+    names = [name for name in NAMES if name != 'Risperidone']
+    found, _ = extract_doses('2.4', [{'text': text, 'level': None}], name_pattern(names), CANONICAL)
+    assert [(d.medication, d.low) for d in found] == [('Olanzapine', 10.0)]
+
+
+@pytest.mark.parametrize('text, expected', [
+    # 4.7
+    ("sodium bicarbonate 1 mEq per kg IV/IO", [('Sodium Bicarbonate', 1.0, 1.0, 'mEq/kg')]),
+    # 3.8
+    ("Epinephrine infusion - 2 mcg to 10 mcg per minute IV/IO, by infusion pump ONLY, mixed according to "
+     "your formulary/pump library.", [('Epinephrine', 2.0, 10.0, 'mcg/min')]),
+    # 2.16A: "2-10 mcg/" lost its "min" to the column layout
+    ("• 2-10 mcg/min IV/IO, Epinephrine Epinephrine 2-10 mcg/min IV/IO, administration by infusion - 2-10 mcg/ "
+     "infusion - 2-10 mcg/ administration by infusion pump ONLY, m in IV/IO, min IV/IO, infusion pump ONLY, OR "
+     "administration by administration by OR", [('Epinephrine', 2.0, 10.0, 'mcg/min')]),
+])
+def test_units(text, expected):
+    assert doses(text)[0] == expected
+
+
+def test_total_dose_is_a_maximum():
+    # 3.3A
+    found, _ = extract_doses('3.3A', [{
+        'text': "Atropine sulfate 1.0 mg IV/IO every three (3) to five (5) minutes up to total dose 3 mg may be "
+                "considered while waiting for pacer set-up.",
+        'level': 'P',
+    }], NAMES_RE, CANONICAL)
+    assert [(d.medication, d.low, d.unit, d.max_dose, d.max_unit) for d in found] == [('Atropine', 1.0, 'mg', 3.0, 'mg')]
+
+
+def test_unreadable_maximum_is_unparsed():
+    # 4.7: "50mq"
+    found, unparsed = doses("For Crush Syndrome patients, administer sodium bicarbonate 1 mEq per kg IV/IO to a "
+                            "maximum dose of 50mq over 5 minutes.")
+    assert found == []
+    assert unparsed
@@ -0,0 +1,33 @@
+"""Search-as-you-type sessions must rank like a fresh search."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from corpus import load_corpus
+from search_index import SearchIndex, SearchSession
+from synonyms import load_synonyms
+
+
+@pytest.fixture(scope='module')
+def index():
+    return SearchIndex(load_corpus().protocols, synonyms=load_synonyms())
+
+
+def typed(text):
+    return [text[:i] for i in range(1, len(text) + 1)]
+
+
+@pytest.mark.parametrize('text', ['"jaw thrust', '-jaw', '. cardiac arrest', 'cardiac arrest', 'chest pain'])
+def test_session_matches_fresh_search(index, text):
+    session = SearchSession(index)
+    for query in typed(text):
+        assert session.search(query) == index.search(query), query
+
+
+def test_no_terms_narrow_nothing(index):
+    assert not index.narrows('"')
+    assert index.search('jaw')
@@ -0,0 +1,43 @@
+"""A service's view of the snapshot, from the example services file."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services import ServiceView, load_services
+from snapshot import load_snapshot
+
+EXAMPLE_PATH = Path(__file__).parent / "services_example.json"
+
+
+@pytest.fixture(scope='module')
+def view():
+    return ServiceView(load_snapshot(), load_services(EXAMPLE_PATH)['example'])
+
+
+def test_no_services_without_a_file(tmp_path):
+    assert load_services(tmp_path / "services.json") == {}
+
+
+def test_options_not_adopted_are_hidden(view):
+    assert view.shows('6.0') and view.shows('6.1')
+    assert not view.shows('6.2')
+    assert view.shows('2.14')
+
+
+def test_addenda(view):
+    proto = view.snapshot.corpus.by_id['2.14']
+    assert view.protocol(proto) is not proto
+    assert 'EXAMPLE AMBULANCE ADDENDUM' in view.protocol(proto).content
+    assert view.search_addenda('poison center') == ['2.14']
+
+
+def test_completions_drop_hidden_protocols(view):
+    items = view.snapshot.completions.complete('cric', k=6)
+    kept = view.completions(items)
+    # Title completions name protocols too: "6.2 · Surgical Cricothyrotomy"
+    assert '6.2' in [pid for item in items for pid in item[3]]
+    assert [item[1] for item in kept] == ['6.1']